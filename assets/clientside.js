@@ -0,0 +1,126 @@
+// File      ASSETS | clientside
+// Author    Matteo Naccarato
+
+// Clientside callbacks:
+//   - sliders filter the figures in the browser, from the data shipped once in a dcc.Store
+//     (see f1db_utils.getFilterableFigure), without any request to the server
+//   - static figures are fetched from their own route, cached by the browser
+
+(function () {
+    // plotly.py sends numpy arrays as {dtype, bdata (base64), shape}
+    var TYPED_ARRAYS = {
+        i1: Int8Array, u1: Uint8Array, u1c: Uint8ClampedArray,
+        i2: Int16Array, u2: Uint16Array,
+        i4: Int32Array, u4: Uint32Array,
+        f4: Float32Array, f8: Float64Array
+    };
+    var POINT_KEYS = ["x", "y", "customdata", "text", "hovertext", "ids"];
+    var MARKER_POINT_KEYS = ["size", "color", "opacity", "symbol"];
+
+    // @returns -> {value} as a plain array (rows of arrays if 2D) if it is an encoded numpy array, {value} itself otherwise
+    function decode(value) {
+        if (!value || typeof value !== "object" || Array.isArray(value) || typeof value.bdata !== "string") {
+            return value;
+        }
+        var binary = atob(value.bdata);
+        var bytes = new Uint8Array(binary.length);
+        for (var i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        var flat = Array.from(new TYPED_ARRAYS[value.dtype](bytes.buffer));
+        var shape = String(value.shape || flat.length).split(",").map(Number);
+        if (shape.length < 2) {
+            return flat;
+        }
+        var rows = [];
+        for (var row = 0; row < shape[0]; row++) {
+            rows.push(flat.slice(row * shape[1], (row + 1) * shape[1]));
+        }
+        return rows;
+    }
+
+    // @returns -> elements {keep} of {value} if it has one element per point ({numPoints}), {value} itself otherwise
+    function pick(value, numPoints, keep) {
+        var values = decode(value);
+        if (!Array.isArray(values) || values.length !== numPoints) {
+            return value;
+        }
+        return keep.map(function (idx) { return values[idx]; });
+    }
+
+    function maxOf(values) {
+        return values.reduce(function (max, value) { return Math.max(max, value); }, -Infinity);
+    }
+
+    // @returns -> copy of {trace} with only its points {keep}
+    function filterTrace(trace, numPoints, keep) {
+        var filtered = Object.assign({}, trace);
+        POINT_KEYS.forEach(function (key) {
+            if (key in trace) {
+                filtered[key] = pick(trace[key], numPoints, keep);
+            }
+        });
+        if (trace.marker) {
+            filtered.marker = Object.assign({}, trace.marker);
+            MARKER_POINT_KEYS.forEach(function (key) {
+                if (key in trace.marker) {
+                    filtered.marker[key] = pick(trace.marker[key], numPoints, keep);
+                }
+            });
+            // Bubble sizes are scaled on the biggest one (as plotly express does)
+            var sizes = decode(trace.marker.size);
+            if (trace.marker.sizeref && Array.isArray(sizes) && keep.length > 0) {
+                filtered.marker.sizeref = trace.marker.sizeref * maxOf(filtered.marker.size) / maxOf(sizes);
+            }
+        }
+        return filtered;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        f1data: {
+            // @returns -> figure of {data} with only the points whose value is >= {value} (threshold) or in {value} ([min, max] range)
+            filterFigure: function (data, value) {
+                if (!data) {
+                    return window.dash_clientside.no_update;
+                }
+                if (!data.values) {
+                    return data.figure;
+                }
+
+                var range = Array.isArray(value) ? value : [value === null || value === undefined ? data.min : value, Infinity];
+                var keep = [];
+                data.values.forEach(function (pointValue, idx) {
+                    if (pointValue >= range[0] && pointValue <= range[1]) {
+                        keep.push(idx);
+                    }
+                });
+                if (keep.length === 0 && data.empty) {
+                    return data.empty;
+                }
+
+                var numPoints = data.values.length;
+                return Object.assign({}, data.figure, {
+                    data: (data.figure.data || []).map(function (trace) { return filterTrace(trace, numPoints, keep); })
+                });
+            },
+
+            // @returns -> static figure {id.name}, fetched from its route (see f1db_figures): the browser keeps it until its ETag changes
+            loadStaticFigure: function (id) {
+                var config = JSON.parse(document.getElementById("_dash-config").textContent);
+                return fetch(config.requests_pathname_prefix + "figures/" + encodeURIComponent(id.name)).then(function (response) {
+                    return response.ok ? response.json() : window.dash_clientside.no_update;
+                });
+            },
+
+            // @returns -> [max, marks] of a min value slider, from the values of {data}
+            getSliderMax: function (data) {
+                if (!data) {
+                    return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+                }
+                var marks = {1: "1"};
+                marks[data.max] = String(data.max);
+                return [data.max, marks];
+            }
+        }
+    });
+})();
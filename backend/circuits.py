@@ -1,9 +1,13 @@
 # File      BACKEND | CIRCUITS
 # Author    Matteo Naccarato
 
+import numpy as np
 import pandas as pd
 
 import backend.f1db_utils as f1db_utils
+import backend.f1db_tables as f1db_tables
+import backend.f1db_aggregates as f1db_aggregates
+import backend.f1db_query as f1db_query
 
 
 # LABELS DICT
@@ -22,7 +26,8 @@ labels_dict = {
     "type": "Circuit Type",
     "countryName": "Country",
     "positionQualifying": "Qualifying",
-    "positionRace": "Race"
+    "positionRace": "Race",
+    "poleSpeed": "Pole Speed (km/h)"
 }
 
 not_a_number_replace = {
@@ -39,11 +44,9 @@ not_a_number_replace = {
 # FUNCTIONS
 # @returns -> circuits dataframe with countries information
 def getCircuits():
-    df = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.circuits}")
-    df.rename(columns={"id": "circuitId", "name":"circuitName"}, inplace=True)
+    df = f1db_tables.getTable(f1db_utils.circuits)
     df.drop(columns=df.columns.difference(["circuitId", "circuitName", "countryId"]), inplace=True)
-    df_countries = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.countries}")
-    df_countries.rename(columns={"id": "countryId", "name":"countryName"}, inplace=True)
+    df_countries = f1db_tables.getTable(f1db_utils.countries)
     df_countries.drop(columns=df_countries.columns.difference(["countryId", "countryName", "alpha3Code"]), inplace=True)
     df = pd.merge(df, df_countries, on="countryId", how="left")
     
@@ -53,11 +56,10 @@ def getCircuits():
 # UP-LEFT GRAPH (GP Held)
 # @returns -> circuits dataframe which held more races than {minValue}
 def get_gp_held(minValue):
-    df = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.circuits}")
-    df.sort_values(by=["totalRacesHeld", "name"], ascending=False, inplace=True)
+    df = f1db_tables.getTable(f1db_utils.circuits)
+    df.sort_values(by=["totalRacesHeld", "circuitName"], ascending=False, inplace=True)
     
-    df_countries = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.countries}")
-    df_countries.rename(columns={"id": "countryId", "name":"countryName"}, inplace=True)
+    df_countries = f1db_tables.getTable(f1db_utils.countries)
     df_countries.drop(columns=df_countries.columns.difference(["countryId", "countryName", "alpha3Code"]), inplace=True)
     df = pd.merge(df, df_countries, on="countryId", how="left")
     
@@ -69,29 +71,33 @@ def get_gp_held(minValue):
 
 
 # UP-RIGHT GRAPH (Qualifying vs Race)
-# @returns -> dataframe of selected circuits (only 1 circuit is accepted due to graphical visualization) 
-#               and information about qualifying position and race result of each driver who competed on that circuit
-def get_quali_race(selected_circuits):
-    if len(selected_circuits) != 1: f1db_utils.warning_empty_dataframe
-    
-    df = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.qualifying_results}")
+# Columns the qualifying x race cube is derived from
+quali_race_tables = {
+    f1db_utils.qualifying_results: ["raceId", "positionText", "driverId"],
+    f1db_utils.races_results: ["raceId", "positionText", "driverId"],
+    f1db_utils.races: ["raceId", "circuitId", "officialName"],
+    f1db_utils.drivers_info: ["driverId", "driverName"]
+}
+
+# @returns -> qualifying position and race result of each driver in each race of the seasons since {fromYear}, sorted by year
+#               (not qualified drivers have positionQualifying = 0). Built once per f1db version, only the latest seasons
+#               are merged again when a new one is loaded
+@f1db_aggregates.perVersion(tables=quali_race_tables, seasonal=True)
+def getQualiRaceEntries(fromYear=None):
+    df = f1db_tables.getTable(f1db_utils.qualifying_results)
     df.rename(columns={"positionText":"positionQualifying"}, inplace=True)
-    df.drop(columns=df.columns.difference(["raceId","positionQualifying","driverId"]), inplace=True)
+    df = f1db_aggregates.getSeasonsSince(df[["year", "raceId", "positionQualifying", "driverId"]], fromYear).drop(columns=["year"])
     
-    df_races_results = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.races_results}")
-    df_races_results.rename(columns={"id": "raceId", "positionText": "positionRace"}, inplace=True)
-    df_races_results.drop(columns=df_races_results.columns.difference(["raceId", "positionRace", "driverId"]), inplace=True)
+    df_races_results = f1db_tables.getTable(f1db_utils.races_results)
+    df_races_results.rename(columns={"positionText": "positionRace"}, inplace=True)
+    df_races_results = f1db_aggregates.getSeasonsSince(df_races_results[["year", "raceId", "positionRace", "driverId"]], fromYear).drop(columns=["year"])
     
-    df_drivers_info = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.drivers_info}")
-    df_drivers_info.rename(columns={"id":"driverId", "name":"driverName"}, inplace=True)
+    df_drivers_info = f1db_tables.getTable(f1db_utils.drivers_info)
     df_drivers_info.drop(columns=df_drivers_info.columns.difference(["driverId", "driverName"]), inplace=True)
     
-    df_races = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.races}")
-    df_races.rename(columns={"id":"raceId"}, inplace=True)
-    df_races.drop(columns=df_races.columns.difference(["raceId", "circuitId", "officialName"]), inplace=True)
+    df_races = f1db_tables.getTable(f1db_utils.races)
+    df_races.drop(columns=df_races.columns.difference(["raceId", "year", "circuitId", "officialName"]), inplace=True)
     df_races_circuits = pd.merge(df_races_results, df_races, on="raceId", how="left")
-    selected_circuits_mask = df_races_circuits["circuitId"].isin(selected_circuits)
-    df_races_circuits = df_races_circuits[selected_circuits_mask]
     
     df = pd.merge(df, df_races_circuits, on=["raceId","driverId"], how="right")
     df = pd.merge(df, df_drivers_info, on="driverId", how="left")
@@ -105,43 +111,176 @@ def get_quali_race(selected_circuits):
     df['positionQualifying'] = df['positionQualifying'].replace(not_a_number_replace) 
     df["positionQualifying"] = df["positionQualifying"].fillna(f1db_utils.INFINITE_RESULT)
     df['positionQualifying'] = df['positionQualifying'].astype(int)
-    max_quali_value = df[df["positionQualifying"] != f1db_utils.INFINITE_RESULT]["positionQualifying"].max()
-    # Replace qualifying NaN (previously replaced with INFINITE) with max real qualifying result + 1
-    df["positionQualifying"] = df["positionQualifying"].replace(f1db_utils.INFINITE_RESULT, max_quali_value + 1)
     df = df[df["positionQualifying"] > 0]
+    # Not qualified position depends on the selected circuits (max real qualifying result + 1): it is stored as 0
+    df["positionQualifying"] = df["positionQualifying"].replace(f1db_utils.INFINITE_RESULT, 0)
+    return df.reset_index(drop=True)
+
+# @returns -> qualifying position and race result of each driver who competed on each circuit, built once per f1db version:
+#               - "circuitIds": circuits (sorted), the entries of the i-th one are [offsets[i], offsets[i+1])
+#               - "raceId", "year", "positionQualifying", "positionRace", "officialName", "driverName": one entry per driver per race,
+#                   sorted by circuit and then by race (most recent first). Not qualified drivers have positionQualifying = 0
+#               - "counts": circuit x qualifying position (0 = not qualified) x race result cube, with the number of entries of each cell
+@f1db_aggregates.perVersion(tables=quali_race_tables)
+def getQualiRaceCube():
+    df = getQualiRaceEntries()
+    df = df.sort_values(by=["circuitId", "raceId"], ascending=[True, False], kind="stable")
+    circuitIds, starts = np.unique(df["circuitId"].to_numpy(), return_index=True)
+    
+    cube = {
+        "circuitIds": circuitIds,
+        "offsets": np.append(starts, len(df)),
+        "raceId": df["raceId"].to_numpy(),
+        "year": df["year"].to_numpy(),
+        "positionQualifying": df["positionQualifying"].to_numpy(),
+        "positionRace": df["positionRace"].to_numpy(),
+        "officialName": df["officialName"].to_numpy(),
+        "driverName": df["driverName"].to_numpy()
+    }
+    circuitIdx = np.repeat(np.arange(len(circuitIds)), np.diff(cube["offsets"]))
+    cube["counts"] = np.zeros((len(circuitIds), cube["positionQualifying"].max() + 1, cube["positionRace"].max() + 1), dtype=np.int64)
+    np.add.at(cube["counts"], (circuitIdx, cube["positionQualifying"], cube["positionRace"]), 1)
+    
+    for values in cube.values():
+        values.flags.writeable = False
+    return cube
+
+# @returns -> indexes in the cube of {selected_circuits} (unknown circuits are ignored)
+def getQualiRaceCircuits(selected_circuits):
+    cube = getQualiRaceCube()
+    selected_circuits = np.unique(np.asarray(selected_circuits, dtype=object))
+    idx = np.searchsorted(cube["circuitIds"], selected_circuits)
+    found = idx < len(cube["circuitIds"])
+    found[found] = cube["circuitIds"][idx[found]] == selected_circuits[found]
+    return idx[found]
+
+# @returns -> entries (indexes in the cube) of {selected_circuits}, only the years in {yearRange} if not None
+def getQualiRaceSelection(selected_circuits, yearRange=None):
+    cube = getQualiRaceCube()
+    slices = []
+    for i in getQualiRaceCircuits(selected_circuits):
+        start, end = cube["offsets"][i], cube["offsets"][i + 1]
+        if yearRange is not None: # years are sorted from the most recent one
+            years = -cube["year"][start:end]
+            start, end = start + np.searchsorted(years, -yearRange[1], side="left"), start + np.searchsorted(years, -yearRange[0], side="right")
+        slices.append(np.arange(start, end))
+    return np.concatenate(slices) if slices else np.array([], dtype=np.int64)
+
+# @returns -> (not qualified position, min and max qualifying position) of {positionQualifying} (0 = not qualified),
+#               the not qualified drivers are placed right after the worst real qualifying position
+def getQualiPositionsRange(positionQualifying):
+    max_quali_value = positionQualifying.max() if len(positionQualifying) else 0
+    not_qualified = max_quali_value + 1
+    qualified = positionQualifying[positionQualifying > 0]
+    quali_min = qualified.min() if len(qualified) else not_qualified
+    quali_max = not_qualified if (positionQualifying == 0).any() else max(max_quali_value, quali_min)
+    return not_qualified, quali_min, quali_max
+
+# @returns -> dataframe of selected circuits (and years in {yearRange}, all if None)
+#               with information about qualifying position and race result of each driver who competed on those circuits
+def get_quali_race(selected_circuits, yearRange=None):
+    cube = getQualiRaceCube()
+    entries = getQualiRaceSelection(selected_circuits, yearRange)
+    df = pd.DataFrame({col: cube[col][entries] for col in ["raceId", "positionQualifying", "driverName", "officialName", "positionRace"]})
+    not_qualified, _, _ = getQualiPositionsRange(df["positionQualifying"].to_numpy())
+    df["positionQualifying"] = df["positionQualifying"].replace(0, not_qualified)
     
     return df
+
+# @returns -> [dataframe with one row per (qualifying position, race result) of the selected circuits (and years in {yearRange}, all if None),
+#               with the number of drivers ("count"), the number of drivers in that qualifying position ("total"), their ratio ("count_per_total")
+#               and the races and drivers of the cell, most recent first ("raceDriverInfo"), only for qualifying positions in {qualiRange},
+#              min qualifying position, max qualifying position]
+def get_quali_race_counts(selected_circuits, qualiRange, yearRange=None):
+    cube = getQualiRaceCube()
+    entries = getQualiRaceSelection(selected_circuits, yearRange)
+    not_qualified, quali_min, quali_max = getQualiPositionsRange(cube["positionQualifying"][entries])
+    
+    # Count matrix (qualifying position x race result) of the selection: precomputed for whole circuits
+    if yearRange is None:
+        counts = cube["counts"][getQualiRaceCircuits(selected_circuits)].sum(axis=0)
+    else:
+        counts = np.zeros(cube["counts"].shape[1:], dtype=np.int64)
+        np.add.at(counts, (cube["positionQualifying"][entries], cube["positionRace"][entries]), 1)
+    
+    # Qualifying positions in {qualiRange} (0 = not qualified, i.e. {not_qualified})
+    positions = np.arange(counts.shape[0])
+    positions = np.where(positions == 0, not_qualified, positions)
+    in_range = (positions >= int(qualiRange[0])) & (positions <= int(qualiRange[1]))
+    
+    order = np.argsort(positions, kind="stable")
+    order = order[in_range[order]]
+    quali_idx, race_idx = np.nonzero(counts[order])
+    quali_idx = order[quali_idx]
+    totals = counts.sum(axis=1)
+    
+    freq_df = pd.DataFrame({
+        "positionQualifying": positions[quali_idx],
+        "positionRace": race_idx,
+        "count": counts[quali_idx, race_idx],
+        "total": totals[quali_idx]
+    })
+    freq_df["count_per_total"] = freq_df["count"] / freq_df["total"] * 100
+    
+    # Contributing races and drivers of each cell, most recent first
+    cells = cube["positionQualifying"][entries] * counts.shape[1] + cube["positionRace"][entries]
+    entries = entries[np.lexsort((-cube["raceId"][entries], cells))]
+    cells = cube["positionQualifying"][entries] * counts.shape[1] + cube["positionRace"][entries]
+    cell_starts = np.searchsorted(cells, quali_idx * counts.shape[1] + race_idx)
+    freq_df["raceDriverInfo"] = [
+        [{"officialName": officialName, "driverName": driverName} for officialName, driverName in zip(cube["officialName"][cell_entries], cube["driverName"][cell_entries])]
+        for cell_entries in (entries[start:start + count] for start, count in zip(cell_starts, freq_df["count"]))
+    ]
+    
+    return [freq_df, quali_min, quali_max]
     
     
 # BOTTOM GRAPH (Pole Lap Time)
-# @returns -> dataframe of selected circuits with pole lap time progress over the years
-def get_qualifying_times(selected_circuits):
-    df = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.qualifying_results}")
+# Columns the pole lap times are derived from
+pole_times_tables = {
+    f1db_utils.qualifying_results: ["raceId", "positionNumber", "driverId", "time", "timeMillis", "q3", "q3Millis"],
+    f1db_utils.races: ["raceId", "circuitId", "grandPrixId", "officialName", "qualifyingFormat", "courseLength"],
+    f1db_utils.drivers_info: ["driverId", "driverName"],
+    f1db_utils.circuits: ["circuitId", "circuitName", "countryId"]
+}
+
+# @returns -> one row per pole (year, driver, lap time, qualifying format, ...) of the seasons since {fromYear}, sorted by year.
+#               "poleSpeed" is the average speed (km/h) of the pole lap, from the {courseLength} of the race.
+#               Built once per f1db version, only the latest seasons are merged again when a new one is loaded
+@f1db_aggregates.perVersion(tables=pole_times_tables, seasonal=True)
+def getPoleTimes(fromYear=None):
+    df = f1db_tables.getTable(f1db_utils.qualifying_results)
+    df.drop(columns=df.columns.difference(["raceId", "year", "positionNumber", "driverId", "time", "timeMillis", "q3", "q3Millis"]), inplace=True)
+    df = f1db_aggregates.getSeasonsSince(df, fromYear)
+    df = df[f1db_utils.get_p1_mask(df, f1db_utils.PerformanceType.POLES.value)].drop(columns=["positionNumber"])
     
-    df_races = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.races}")
-    df_races.rename(columns={"id": "raceId"}, inplace=True)
-    df_races.drop(columns=df_races.columns.difference(["raceId", "circuitId", "grandPrixId", "officialName", "qualifyingFormat"]), inplace=True)
-    df_drivers_info = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.drivers_info}")
-    df_drivers_info.rename(columns={"id":"driverId", "name":"driverName"}, inplace=True)
+    df_races = f1db_tables.getTable(f1db_utils.races)
+    df_races.drop(columns=df_races.columns.difference(["raceId", "circuitId", "grandPrixId", "officialName", "qualifyingFormat", "courseLength"]), inplace=True)
+    df_drivers_info = f1db_tables.getTable(f1db_utils.drivers_info)
     df_drivers_info.drop(columns=df_drivers_info.columns.difference(["driverId", "driverName"]), inplace=True)
     
-    df_circuits = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.circuits}")
-    df_circuits.rename(columns={"id": "circuitId", "name": "circuitName"}, inplace=True)
+    df_circuits = f1db_tables.getTable(f1db_utils.circuits)
     df_circuits.drop(columns=df_circuits.columns.difference(["circuitId", "circuitName", "countryId"]), inplace=True)
     
     df = pd.merge(df, df_races, on="raceId", how="left")
     df = pd.merge(df, df_drivers_info, on="driverId", how="left")
     df = pd.merge(df, df_circuits, on="circuitId", how="left")
     
-    # Filter by Pole and Selected Circuits
-    df = df[f1db_utils.get_p1_mask(df, f1db_utils.PerformanceType.POLES.value)]
-    selected_circuits_mask = df["circuitId"].isin(selected_circuits)
-    df = df[selected_circuits_mask]
     # Merge different types of Qualifying format ({time} and {q3})
     df["time"] = df["time"].fillna(df["q3"])
     df["timeMillis"] = df["timeMillis"].fillna(df["q3Millis"])
+    df["poleSpeed"] = df["courseLength"] / df["timeMillis"] * 3_600_000
     
-    df.reset_index(inplace=True)
-    df.drop(columns=df.columns.difference(["year", "driverId", "driverName", "time", "timeMillis", "circuitId", "circuitName", "grandPrixId", "officialName", "qualifyingFormat"]), inplace=True)
-    
-    return df
\ No newline at end of file
+    df.drop(columns=df.columns.difference(["raceId", "year", "driverId", "driverName", "time", "timeMillis", "circuitId", "circuitName", "grandPrixId", "officialName", "qualifyingFormat", "poleSpeed"]), inplace=True)
+    return df
+
+# @returns -> pole lap times of every circuit (see getPoleTimes) indexed by circuitId (see f1db_query.buildIndex), built once per f1db version.
+#               Sorted by circuit and then by year
+@f1db_aggregates.perVersion(tables=pole_times_tables)
+def getPoleTimesStore():
+    return f1db_query.buildIndex(getPoleTimes(), "circuitId")
+
+# @returns -> dataframe of selected circuits with pole lap time progress over the years,
+#               circuits in the same order of {selected_circuits}
+def get_qualifying_times(selected_circuits):
+    return f1db_query.select(getPoleTimesStore(), selected_circuits)
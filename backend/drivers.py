@@ -2,9 +2,11 @@
 # Author    Matteo Naccarato
 
 import pandas as pd
-from collections import defaultdict
 
 import backend.f1db_utils as f1db_utils
+import backend.f1db_tables as f1db_tables
+import backend.f1db_aggregates as f1db_aggregates
+import backend.f1db_query as f1db_query
 
 
 MIN_VALUE_DEFAULT = 0
@@ -68,8 +70,7 @@ def performanceType2Mask(df, performanceType):
 # @returns -> drivers dataframe. 
 #               {filterFlag} is used to return drivers who achieved at least one positive result in performance (e.g. WDCs, Wins, ...)
 def getDrivers(filterFlag = None):
-    df = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.drivers_info}")
-    df.rename(columns={"id":"driverId", "name":"driverName"}, inplace=True)
+    df = f1db_tables.getTable(f1db_utils.drivers_info)
     df.drop(columns=df.columns.difference(["driverId", "driverName"]), inplace=True)
     
     if filterFlag is not None: # e.g. WDCs => return only drivers who have won at least one WDCs
@@ -82,7 +83,7 @@ def getDrivers(filterFlag = None):
     
 # @returns -> dataframe with number of official and test drivers over the years
 def getNumDriversPerYear():
-    df = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.seasons_entrants_drivers}")
+    df = f1db_tables.getTable(f1db_utils.seasons_entrants_drivers)
     df.drop(columns=["entrantId","constructorId","engineManufacturerId","rounds","roundsText"], inplace=True)
     no_test_driver_mask = df["testDriver"] == False
     df_by_year = df[no_test_driver_mask].groupby(by=["year"]).count()
@@ -99,21 +100,19 @@ def getNumDriversPerYear():
 
 # @returns -> dataframe with drivers evolution by country and over the years
 def getWorldSpread():
-    df_drivers_entrants = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.seasons_entrants_drivers}")
-    df_drivers_info = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.drivers_info}")
-    df_countries = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.countries}")
-    df_continents = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.continents}")
+    df_drivers_entrants = f1db_tables.getTable(f1db_utils.seasons_entrants_drivers)
+    df_drivers_info = f1db_tables.getTable(f1db_utils.drivers_info)
+    df_countries = f1db_tables.getTable(f1db_utils.countries)
+    df_continents = f1db_tables.getTable(f1db_utils.continents)
     
     df_drivers_entrants.drop(columns=df_drivers_entrants.columns.difference(["year","driverId"]), inplace=True)
     
-    df_drivers_info.drop(columns=df_drivers_info.columns.difference(["id","name","nationalityCountryId"]), inplace=True)
-    df_drivers_info.rename(columns={"id":"driverId", "name": "driverName"}, inplace=True)
+    df_drivers_info.drop(columns=df_drivers_info.columns.difference(["driverId","driverName","nationalityCountryId"]), inplace=True)
         
-    df_countries.drop(columns=df_countries.columns.difference(["id", "alpha3Code", "name", "continentId"]), inplace=True)
-    df_countries.rename(columns={"id":"nationalityCountryId", "name":"countryName"}, inplace=True)
+    df_countries.drop(columns=df_countries.columns.difference(["countryId", "alpha3Code", "countryName", "continentId"]), inplace=True)
+    df_countries.rename(columns={"countryId":"nationalityCountryId"}, inplace=True)
         
-    df_continents.drop(columns=df_continents.columns.difference(["id", "name"]), inplace=True)
-    df_continents.rename(columns={"id":"continentId","name":"continentName"},inplace=True)
+    df_continents.drop(columns=df_continents.columns.difference(["continentId", "continentName"]), inplace=True)
    
     df_merged = pd.merge(df_drivers_entrants, df_drivers_info, on="driverId", how="left")
     df_merged = pd.merge(df_merged, df_countries, on="nationalityCountryId", how="left")
@@ -125,73 +124,96 @@ def getWorldSpread():
     return df_merged
 
 
-# @returns -> drivers dataframe with their absolute count of performance achievements (WDCs, Wins, Podiums, Poles)
-def getAbsolutePerformance(performanceType, minValue, colToApplyMin):
-    df = pd.read_csv(f"{f1db_utils.folder}/{performanceType2file[performanceType]}")
-    df_drivers_info = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.drivers_info}")
-    df_drivers_info.rename(columns={"id":"driverId", "name":"driverName"}, inplace=True)
+# Results counted by the achievement index (positionNumber == 1 for WDCs and Poles)
+achievements_tables = {
+    f1db_utils.races_results: ["driverId", "positionNumber"],
+    f1db_utils.seasons_driver_standings: ["driverId", "positionNumber"],
+    f1db_utils.qualifying_results: ["driverId", "positionNumber"]
+}
+
+# Achievements of each season, built once per dataset version (only the latest seasons are counted again when a new one is loaded)
+# @returns -> one row per (year, driver) who achieved at least one result in that season, sorted by year and driver, with the count of
+#               race results (count_position_1 = Wins, count_position_2, count_position_3), WDCs and Poles of the seasons since {fromYear}
+@f1db_aggregates.perVersion(tables=achievements_tables, seasonal=True)
+def getSeasonAchievements(fromYear=None):
+    # P1, P2, P3
+    df_races_results = f1db_aggregates.getSeasonsSince(f1db_tables.getTable(f1db_utils.races_results)[["year", "driverId", "positionNumber"]], fromYear)
+    df_podiums = df_races_results[df_races_results["positionNumber"] <= 3.0]
+    df_counts = df_podiums.groupby(["year", "driverId", "positionNumber"], observed=True).size().unstack(fill_value=0)
+    df_counts = df_counts.reindex(columns=[1.0, 2.0, 3.0], fill_value=0)
+    df_counts.columns = [f"count_position_{int(place)}" for place in df_counts.columns]
+    
+    # WDCs and Poles (the current season WDC is masked by the achievement index)
+    counts = [df_counts]
+    for performanceType in [f1db_utils.PerformanceType.WDCS.value, f1db_utils.PerformanceType.POLES.value]:
+        df = f1db_aggregates.getSeasonsSince(f1db_tables.getTable(performanceType2file[performanceType])[["year", "driverId", "positionNumber"]], fromYear)
+        counts.append(df[df["positionNumber"] == 1.0].groupby(["year", "driverId"], observed=True).size().rename(performanceType))
+    
+    df_counts = pd.concat(counts, axis=1).fillna(0).astype("int64")
+    return df_counts.sort_index().reset_index()
+
+
+# Achievement index, built once per dataset version
+# @returns -> drivers who achieved at least one result, with their absolute count of 
+#               race results (count_position_1 = Wins, count_position_2, count_position_3, count_podiums), WDCs and Poles
+#               {currentYear} and {currentSeasonOver} (see f1db_utils.getCurrentSeason) are part of the key:
+#               the current season WDC is counted only when the season is over
+@f1db_aggregates.perVersion(tables={**achievements_tables, f1db_utils.drivers_info: ["driverId", "driverName"]})
+def getAchievementIndex(currentYear, currentSeasonOver):
+    df_drivers_info = f1db_tables.getTable(f1db_utils.drivers_info)
     df_drivers_info.drop(columns=df_drivers_info.columns.difference(["driverId", "driverName"]), inplace=True)
-    df.drop(columns=df.columns.difference(["positionNumber","driverId","year"]), inplace=True)
     
+    df = getSeasonAchievements()
+    wdcs = f1db_utils.PerformanceType.WDCS.value
+    df[wdcs] = df[wdcs].where(f1db_utils.getWdcsMask(df, currentYear, currentSeasonOver), 0)
+    df_counts = df.drop(columns=["year"]).groupby("driverId", observed=True).sum()
+    df_counts.insert(3, "count_podiums", df_counts[["count_position_1", "count_position_2", "count_position_3"]].sum(axis=1))
+    df_counts = df_counts[df_counts.any(axis=1)]
+    
+    return pd.merge(df_drivers_info, df_counts, left_on="driverId", right_index=True, how="inner")
+
+
+# @returns -> drivers who achieved at least one {performanceType} result, ranked by their count (ties by name)
+@f1db_aggregates.perVersion
+def getAchievementRanking(performanceType, currentYear, currentSeasonOver):
+    df = getAchievementIndex(currentYear, currentSeasonOver)
     match performanceType:
-        # 1st, 2nd, 3rd places only
         case f1db_utils.PerformanceType.PODIUMS.value:
-            podium_mask = (df["positionNumber"] == 1) | (df["positionNumber"] == 2) | (df["positionNumber"] == 3)
-            df = df[podium_mask]
-            for place in [1,2,3]:
-                df[f'count_position_{place}'] = df.groupby('driverId')['positionNumber'].transform(lambda x: (x == place*1.0).sum()) # count P1,P2,P3
-            df["count_podiums"] = df.groupby('driverId')['positionNumber'].transform(lambda x: (x <= 3.0).sum()) # count podiums
-            df.sort_values(by=["count_position_1"], inplace=True, ascending=False)
-            df.drop_duplicates(subset=["driverId","count_position_1","count_position_2","count_position_2"], inplace=True)
+            cols = ["driverId", "count_position_1", "count_position_2", "count_position_3", "count_podiums", "driverName"]
+            sort_col = "count_podiums"
             
-        # 1st place only
-        case f1db_utils.PerformanceType.WINS.value | f1db_utils.PerformanceType.WDCS.value | f1db_utils.PerformanceType.POLES.value:
-            df = df[f1db_utils.get_p1_mask(df, performanceType)]
-            for place in [1]:
-                df[f'count_position_{place}'] = df.groupby('driverId')['positionNumber'].transform(lambda x: (x == place*1.0).sum()) # count P1
-            df.sort_values(by=["count_position_1"], inplace=True, ascending=False)
-            df.drop_duplicates(subset=["driverId","count_position_1"], inplace=True)
-       
-    df.drop(columns=["year"], inplace=True)
-    df = df[df[colToApplyMin] >= minValue]
-    df.reset_index(inplace=True)
-    df.drop(columns=["positionNumber","index"], inplace=True)
-    df = pd.merge(df, df_drivers_info, on="driverId", how="left")
+        case f1db_utils.PerformanceType.WINS.value:
+            cols = ["driverId", "count_position_1", "driverName"]
+            sort_col = "count_position_1"
+            
+        # WDCs and Poles are shown as count_position_1 (1st place only)
+        case f1db_utils.PerformanceType.WDCS.value | f1db_utils.PerformanceType.POLES.value:
+            df = df.drop(columns=["count_position_1"]).rename(columns={performanceType: "count_position_1"})
+            cols = ["driverId", "count_position_1", "driverName"]
+            sort_col = "count_position_1"
+    
+    df = df[df[sort_col] > 0]
+    df = df.sort_values(by="driverName").sort_values(by=sort_col, ascending=False, kind="stable")
+    return df[cols].reset_index(drop=True)
 
+
+# @returns -> drivers dataframe with their absolute count of performance achievements (WDCs, Wins, Podiums, Poles),
+#               sorted by count and filtered by {minValue} on {colToApplyMin}
+def getAbsolutePerformance(performanceType, minValue, colToApplyMin):
+    df = getAchievementRanking(performanceType, *f1db_utils.getCurrentSeason())
+    df = df[df[colToApplyMin] >= minValue]
+    df.reset_index(drop=True, inplace=True)
+    
     return df
 
 
-# Progressive counter following the years
-# e.g. a driver who won WDCs in 2008,2010 will be
-#       2008 | 1
-#       2009 | 1
-#       2010 | 2
-#       2011 | 2
-counter = defaultdict(int)
-def count_p1(row):
-    global counter
-    if row["positionNumber"] == 1.0:
-        counter[row["driverId"]] += 1
-    return counter[row["driverId"]]
-
-# Progressive counter like the one above
-def count_podiums(row):
-    global counter
-    if row["positionNumber"] <= 3.0:
-        counter[row["driverId"]] += 1
-    return counter[row["driverId"]] 
-
-
-# @returns -> drivers dataframe (filtered by {selected_drivers}) with their trend count of performance achievements (WDCs, Wins, Podiums, Poles)
+# @returns -> drivers dataframe (filtered by {selected_drivers}, in the same order) with their trend count of performance achievements (WDCs, Wins, Podiums, Poles)
 def getTrendPerformance(selected_drivers, performanceType):
-    df = pd.read_csv(f"{f1db_utils.folder}/{performanceType2file[performanceType]}")
-    df_drivers_info = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.drivers_info}")
-    df_drivers_info.rename(columns={"id":"driverId", "name":"driverName"}, inplace=True)
+    df_drivers_info = f1db_tables.getTable(f1db_utils.drivers_info)
     df_drivers_info.drop(columns=df_drivers_info.columns.difference(["driverId", "driverName"]), inplace=True)
     
-    # Drivers filter by {selected_drivers}
-    selected_drivers_mask = df["driverId"].isin(selected_drivers) 
-    df = df[selected_drivers_mask]
+    # Drivers filter by {selected_drivers}, in the same order
+    df = f1db_query.select(f1db_query.getTableIndex(performanceType2file[performanceType], "driverId"), selected_drivers)
     if performanceType == f1db_utils.PerformanceType.WDCS.value: 
         df = df[f1db_utils.currentSeasonCheckMask(df, performanceType)]
     else:
@@ -205,23 +227,17 @@ def getTrendPerformance(selected_drivers, performanceType):
         # Get races info
         case f1db_utils.PerformanceType.WINS.value | f1db_utils.PerformanceType.PODIUMS.value | f1db_utils.PerformanceType.POLES.value:
             df.drop(columns=df.columns.difference(["raceId","driverId","positionNumber"]), inplace=True)
-            df_races = pd.read_csv(f"{f1db_utils.folder}/{f1db_utils.races}")
-            df_races.rename(columns={"id":"raceId"}, inplace=True)
+            df_races = f1db_tables.getTable(f1db_utils.races)
             df_races.drop(columns=df_races.columns.difference(["raceId","date","grandPrixId","officialName","circuitId"]), inplace=True)
             df = pd.merge(df, df_races, on="raceId", how="left")
     
-    # Progressive counter of drivers' achievements        
-    for driver_id in selected_drivers:
-        counter[driver_id] = 0
-    df["progressiveCounter"] = df.apply(count_p1 if performanceType != f1db_utils.PerformanceType.PODIUMS.value else count_podiums, axis=1)
+    # Progressive counter of drivers' achievements
+    # (every season is kept for WDCs, only the achieved results for the other performance types)
+    df["progressiveCounter"] = f1db_aggregates.getProgressiveCounter(
+        df, 
+        "driverId", 
+        df["positionNumber"] == 1.0 if performanceType == f1db_utils.PerformanceType.WDCS.value else None
+    )
     df = pd.merge(df, df_drivers_info, on="driverId", how="left")
     
     return df
-
-
-# Default Drivers DataFrames
-dfs = {
-    "numDriversPerYear": getNumDriversPerYear(),
-    "worldSpread": getWorldSpread(),
-    "absolutePerformance": getAbsolutePerformance(PERFORMANCE_TYPE_DEFAULT, MIN_VALUE_DEFAULT, COL_TO_APPLY_MIN_DEFAULT)
-}
\ No newline at end of file
@@ -0,0 +1,128 @@
+# File      BACKEND | f1db_aggregates
+# Author    Matteo Naccarato
+
+import functools
+import threading
+import pandas as pd
+
+import backend.f1db_utils as f1db_utils
+import backend.f1db_tables as f1db_tables
+import backend.f1db_metrics as f1db_metrics
+
+
+# ==================PRECOMPUTED==================
+# Tables derived from the f1db data (e.g. achievement counts), built once per dataset version and shared by every request
+
+precomputed = {} # (module, builder, args) -> {version: result}
+precomputed_locks = {} # (module, builder, args) -> lock, different tables can be built concurrently
+precomputed_lock = threading.Lock()
+MAX_VERSIONS = 2 # the current one and the one being loaded (or still used by running requests)
+MISSING = object()
+
+# Decorator: {builder}(*args) runs only once per f1db version, later calls return the stored result.
+#   Dataframes are stored read-only and handed out as shallow copies (like f1db_tables.getTable)
+# INCREMENTAL: {tables} declares what the result is derived from, {fileName: columns read (None = every column)}
+# (or a function of the builder arguments returning it). When a new version is loaded, the result of the previous one is:
+#   - reused as it is, if none of those columns changed
+#   - updated, if {seasonal} and only the rows of the latest seasons changed (see f1db_tables.getChanges):
+#       the builder is called with fromYear=<first changed season> and returns only the rows of the seasons since then
+#       (sorted by year, with a "year" column), which replace the ones of the previous result
+#   - rebuilt from scratch otherwise (or if {tables} is not declared)
+def perVersion(builder=None, tables=None, seasonal=False):
+    if builder is None:
+        return functools.partial(perVersion, tables=tables, seasonal=seasonal)
+
+    @functools.wraps(builder)
+    def wrapper(*args):
+        version = f1db_tables.getVersion()
+        key = (builder.__module__, builder.__name__, args)
+        result = precomputed.get(key, {}).get(version, MISSING)
+        if result is MISSING:
+            with precomputed_lock:
+                key_lock = precomputed_locks.setdefault(key, threading.Lock())
+            with key_lock:
+                results = precomputed.setdefault(key, {})
+                result = results.get(version, MISSING)
+                if result is MISSING:
+                    result = buildVersion(builder, args, results.get(f1db_tables.getPreviousVersion(), MISSING), tables, seasonal)
+                    if isinstance(result, pd.DataFrame):
+                        f1db_tables.setReadOnly(result)
+                    results[version] = result
+                    while len(results) > MAX_VERSIONS:
+                        del results[next(iter(results))]
+        return result.copy(deep=False) if isinstance(result, pd.DataFrame) else result
+    return wrapper
+
+# @returns -> result of {builder}(*args) for the pinned version, derived from the {previous} one when possible (see perVersion)
+def buildVersion(builder, args, previous, tables, seasonal):
+    name = f"{builder.__module__.split('.')[-1]}.{builder.__name__}"
+    if previous is not MISSING and tables is not None:
+        tables = tables(*args) if callable(tables) else tables
+        changes = [f1db_tables.getChanges(fileName, columns) for fileName, columns in tables.items()]
+        statuses = {change["status"] for change in changes}
+        
+        if statuses == {f1db_tables.UNCHANGED}:
+            f1db_metrics.observePrecomputed(name, "reused")
+            return previous
+        if seasonal and f1db_tables.CHANGED not in statuses:
+            fromYear = min(change["fromYear"] for change in changes if change["status"] == f1db_tables.SEASONS)
+            kept = previous[previous["year"] < fromYear]
+            if len(kept) > 0: # otherwise every season changed
+                result = pd.concat([kept, builder(*args, fromYear=fromYear)], ignore_index=True)
+                if result.dtypes.equals(previous.dtypes): # e.g. no rows since {fromYear} may change them
+                    f1db_metrics.observePrecomputed(name, "incremental")
+                    return result
+    
+    f1db_metrics.observePrecomputed(name, "full")
+    return builder(*args)
+
+# @returns -> rows of {df} (sorted by year) of the seasons since {fromYear} (every row if None)
+def getSeasonsSince(df, fromYear=None):
+    if fromYear is None:
+        return df
+    return df.iloc[df["year"].searchsorted(fromYear, side="left"):]
+
+# Forget every precomputed table
+def clearPrecomputed():
+    with precomputed_lock:
+        precomputed.clear()
+
+# ===============================================
+
+
+# ==================GEO==================
+
+# @returns -> one row per country of {df} (joined on {countryCol}) with its alpha3Code, countryName, continentId and continentName,
+#               plus one column for each of the named {aggregations} (e.g. {"count": ("driverId", "size")}).
+#               Rows whose country (or continent) is unknown are dropped
+def getCountryAggregate(df, aggregations, countryCol="countryId"):
+    df_countries = f1db_tables.getTable(f1db_utils.countries)
+    df_countries.drop(columns=df_countries.columns.difference(["countryId", "alpha3Code", "countryName", "continentId"]), inplace=True)
+    df_continents = f1db_tables.getTable(f1db_utils.continents)
+    df_continents.drop(columns=df_continents.columns.difference(["continentId", "continentName"]), inplace=True)
+
+    if countryCol != "countryId":
+        df = df.rename(columns={countryCol: "countryId"})
+    df = pd.merge(df, df_countries, on="countryId", how="inner")
+    df = pd.merge(df, df_continents, on="continentId", how="inner")
+
+    return df.groupby(["countryId", "alpha3Code", "countryName", "continentId", "continentName"], as_index=False, observed=True).agg(**aggregations)
+
+# =======================================
+
+
+# ==================TRENDS==================
+
+# Progressive counter following the years, computed for every {entityCol} (e.g. driverId, constructorId) in a single pass
+# e.g. a driver who won WDCs in 2008,2010 will be
+#       2008 | 1
+#       2009 | 1
+#       2010 | 2
+#       2011 | 2
+# @returns -> series aligned to {df} with the running count of the rows in {countMask} (every row if None) of each entity,
+#               following the order of {df}. No state is kept between calls
+def getProgressiveCounter(df, entityCol, countMask=None):
+    counted = pd.Series(True, index=df.index) if countMask is None else countMask
+    return counted.astype("int64").groupby(df[entityCol], sort=False, observed=True).cumsum()
+
+# ==========================================
@@ -0,0 +1,112 @@
+# File      BACKEND | f1db_cache
+# Author    Matteo Naccarato
+
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from plotly.basedatatypes import BaseFigure
+
+import backend.f1db_tables as f1db_tables
+
+
+# Outputs (figures, options, ...) of the dashboard callbacks are deterministic functions of their inputs and of the f1db version:
+# they are kept in a LRU cache, bounded by number of entries, memory and age
+MAX_ENTRIES = 512
+MAX_BYTES = 64 * 1024 * 1024 # estimated size of the outputs (see getOutputSize)
+TTL_SECONDS = 24 * 60 * 60
+SIZE_SAMPLES = 32
+SCALAR_SIZE = 8
+
+cache = OrderedDict() # key -> (expiration time, size in bytes, output)
+cache_lock = threading.Lock()
+stats = {
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "bytes": 0
+}
+function_stats = {} # function name -> {hits, misses}
+
+
+# @returns -> hashable key of the inputs (e.g. lists of selected drivers, dropdown options), order is preserved
+def normalizeInputs(args):
+    return json.dumps(args, sort_keys=True, default=str)
+
+# @returns -> estimated size in bytes of {output}, without serializing it (that would cost as much as building it again):
+#               numeric arrays by their size in memory, long lists and text arrays from {SIZE_SAMPLES} of their items,
+#               figures and Dash components by their JSON-like properties
+def getOutputSize(output):
+    if isinstance(output, BaseFigure): # its traces and layout as they are stored (to_plotly_json would deep copy them)
+        output = {"data": output._data, "layout": output._layout}
+    elif hasattr(output, "to_plotly_json"): # Dash components, their properties
+        output = output.to_plotly_json()
+    if isinstance(output, dict):
+        return sum(len(str(key)) + getOutputSize(value) for key, value in output.items())
+    if isinstance(output, np.ndarray) and output.dtype != object:
+        return output.nbytes
+    if isinstance(output, (list, tuple, np.ndarray)):
+        if len(output) <= SIZE_SAMPLES:
+            return sum(getOutputSize(item) for item in output)
+        step = len(output) / SIZE_SAMPLES
+        return round(sum(getOutputSize(output[int(idx * step)]) for idx in range(SIZE_SAMPLES)) * step)
+    if isinstance(output, str):
+        return len(output)
+    return SCALAR_SIZE
+
+def evict():
+    while cache and (len(cache) > MAX_ENTRIES or stats["bytes"] > MAX_BYTES):
+        _, (_, size, _) = cache.popitem(last=False)
+        stats["bytes"] -= size
+        stats["evictions"] += 1
+
+
+# Decorator: outputs of {func} are cached by (function, inputs, f1db version)
+def memoize(func):
+    counters = function_stats.setdefault(func.__name__, {"hits": 0, "misses": 0})
+    
+    @functools.wraps(func)
+    def wrapper(*args):
+        key = (func.__module__, func.__name__, normalizeInputs(args), f1db_tables.getVersion())
+        now = time.monotonic()
+        with cache_lock:
+            entry = cache.get(key)
+            if entry is not None and entry[0] > now:
+                cache.move_to_end(key)
+                stats["hits"] += 1
+                counters["hits"] += 1
+                return entry[2]
+            stats["misses"] += 1
+            counters["misses"] += 1
+
+        output = func(*args)
+        size = getOutputSize(output)
+        with cache_lock:
+            old_entry = cache.pop(key, None)
+            if old_entry is not None:
+                stats["bytes"] -= old_entry[1]
+            cache[key] = (now + TTL_SECONDS, size, output)
+            stats["bytes"] += size
+            evict()
+        return output
+    return wrapper
+
+
+# @returns -> cache counters (hits, misses, evictions, bytes, entries, hitRatio, and hits/misses of each function)
+def getStats():
+    with cache_lock:
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "entries": len(cache),
+            "hitRatio": stats["hits"] / lookups if lookups else 0.0,
+            "functions": {name: counters.copy() for name, counters in function_stats.items()}
+        }
+
+# Forget every cached output
+def clearCache():
+    with cache_lock:
+        cache.clear()
+        stats["bytes"] = 0
@@ -0,0 +1,43 @@
+# File      BACKEND | f1db_figures
+# Author    Matteo Naccarato
+
+import gzip
+import hashlib
+import plotly.io as pio
+
+import backend.f1db_aggregates as f1db_aggregates
+import backend.f1db_metrics as f1db_metrics
+
+
+# STATIC FIGURES: figures which are the same for every request of a dataset version (e.g. the top row of the tabs).
+# They are serialized once per version (orjson if installed), kept gzipped, and fetched by the browser from their own route
+# with a strong ETag, so that they are downloaded again only when the dataset changes
+GZIP_LEVEL = 9
+
+static_figures = {} # name -> builder of the figure
+
+
+# {builder}() returns the static figure {name}
+def addStaticFigure(name, builder):
+    static_figures[name] = builder
+
+# @returns -> names of the static figures
+def getStaticFigureNames():
+    return list(static_figures)
+
+
+# @returns -> static figure {name} of the current version, ready to be sent:
+#               - "identity", "gzip": its JSON body, plain and gzipped
+#               - "etag": strong ETag (unquoted) of each body, they are different representations
+@f1db_aggregates.perVersion
+def getStaticFigure(name):
+    body = pio.to_json(static_figures[name](), validate=False, engine="auto").encode("utf-8")
+    compressed = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0) # same bytes for the same figure, in every worker
+    digest = hashlib.sha1(body).hexdigest()
+
+    f1db_metrics.setStaticFigureSize(name, len(body), len(compressed))
+    return {
+        "identity": body,
+        "gzip": compressed,
+        "etag": {"identity": digest, "gzip": f"{digest}-gzip"}
+    }
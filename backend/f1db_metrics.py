@@ -0,0 +1,194 @@
+# File      BACKEND | f1db_metrics
+# Author    Matteo Naccarato
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Time spent by each dashboard callback, split in stages:
+#   - load          reading the f1db tables (f1db_tables.getTable)
+#   - figure        building the plotly figures
+#   - transform     everything else done by the callback (pandas)
+#   - serialize     from the end of the callback to the response ready to be sent (JSON encoding done by Dash)
+#   - total         the whole callback (serialize excluded)
+STAGES = ["load", "transform", "figure"]
+BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10] # seconds
+
+histograms = {} # (callback, tab, stage) -> {"buckets": counts per bucket, "sum": seconds, "count": observations}
+static_figures_sizes = {} # static figure -> {encoding: size in bytes of the current version}
+static_figures_responses = {} # (static figure, encoding, status) -> {"count": responses, "bytes": body bytes sent}
+precomputed_builds = {} # (builder, kind) -> per-version tables built (see f1db_aggregates.perVersion)
+metrics_lock = threading.Lock()
+current = threading.local() # stages of the callback running in the current thread
+
+
+def observe(callbackName, tab, stageName, seconds):
+    key = (callbackName, tab, stageName)
+    with metrics_lock:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        for idx, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][idx] += 1
+                break
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+
+# Time spent in the block is added to {name} stage of the running callback (if any).
+# Stages can be nested, the time of the inner one is not counted in the outer one
+@contextmanager
+def stage(name):
+    stack = getattr(current, "stack", None)
+    if stack is None:
+        yield
+        return
+    start = time.perf_counter()
+    stack.append(0.0) # time spent in nested stages
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        current.stages[name] += elapsed - stack.pop()
+        stack[-1] += elapsed
+
+
+# Decorator: stage timings of every call of {func}, labelled with its {tab}
+def instrument(tab):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            if getattr(current, "stack", None) is not None: # already inside an instrumented callback
+                return func(*args)
+            current.stack = [0.0]
+            current.stages = dict.fromkeys(STAGES, 0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                end = time.perf_counter()
+                stages = current.stages
+                stages["transform"] += (end - start) - current.stack[0]
+                current.stack = None
+                for stageName, seconds in stages.items():
+                    observe(func.__name__, tab, stageName, seconds)
+                observe(func.__name__, tab, "total", end - start)
+                current.pending = (func.__name__, tab, end)
+        return wrapper
+    return decorator
+
+# Flask after_request hook: the response of the last callback has just been serialized
+def observeSerialize(response):
+    pending = getattr(current, "pending", None)
+    if pending is not None:
+        current.pending = None
+        callbackName, tab, end = pending
+        observe(callbackName, tab, "serialize", time.perf_counter() - end)
+    return response
+
+
+# Size of the static figure {name} once serialized ({size}) and gzipped ({compressedSize})
+def setStaticFigureSize(name, size, compressedSize):
+    with metrics_lock:
+        static_figures_sizes[name] = {"identity": size, "gzip": compressedSize}
+
+# A static figure {name} has been sent ({status} 200, or 304 if still cached by the browser) with {sentBytes} of {encoding} body
+def observeStaticFigure(name, encoding, status, sentBytes):
+    key = (name, encoding, status)
+    with metrics_lock:
+        responses = static_figures_responses.setdefault(key, {"count": 0, "bytes": 0})
+        responses["count"] += 1
+        responses["bytes"] += sentBytes
+
+
+# A per-version table of {builder} has been built: "full" (from scratch), "incremental" (latest seasons only) or "reused" (unchanged)
+def observePrecomputed(builder, kind):
+    key = (builder, kind)
+    with metrics_lock:
+        precomputed_builds[key] = precomputed_builds.get(key, 0) + 1
+
+
+def formatLabels(labels):
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+# @returns -> every metric in the Prometheus text format,
+#               together with the outputs cache counters ({cacheStats}, see f1db_cache.getStats) and the dataset {version}
+def renderMetrics(version, cacheStats):
+    lines = [
+        "# HELP f1data_callback_stage_seconds Time spent by the dashboard callbacks in each stage.",
+        "# TYPE f1data_callback_stage_seconds histogram"
+    ]
+    with metrics_lock:
+        for (callbackName, tab, stageName), histogram in sorted(histograms.items()):
+            labels = {"callback": callbackName, "tab": tab, "stage": stageName}
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram["buckets"]):
+                cumulative += count
+                lines.append(f"f1data_callback_stage_seconds_bucket{formatLabels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"f1data_callback_stage_seconds_bucket{formatLabels({**labels, 'le': '+Inf'})} {histogram['count']}")
+            lines.append(f"f1data_callback_stage_seconds_sum{formatLabels(labels)} {histogram['sum']}")
+            lines.append(f"f1data_callback_stage_seconds_count{formatLabels(labels)} {histogram['count']}")
+
+        lines += [
+            "# HELP f1data_static_figure_bytes Size of the static figures of the current version, plain and gzipped.",
+            "# TYPE f1data_static_figure_bytes gauge"
+        ]
+        for name, sizes in sorted(static_figures_sizes.items()):
+            for encoding, size in sizes.items():
+                lines.append(f"f1data_static_figure_bytes{formatLabels({'figure': name, 'encoding': encoding})} {size}")
+        lines += [
+            "# HELP f1data_static_figure_responses_total Responses of the static figures routes (304 = cached by the browser).",
+            "# TYPE f1data_static_figure_responses_total counter"
+        ]
+        for (name, encoding, status), responses in sorted(static_figures_responses.items()):
+            lines.append(f"f1data_static_figure_responses_total{formatLabels({'figure': name, 'encoding': encoding, 'status': status})} {responses['count']}")
+        lines += [
+            "# HELP f1data_static_figure_sent_bytes_total Body bytes sent by the static figures routes.",
+            "# TYPE f1data_static_figure_sent_bytes_total counter"
+        ]
+        for (name, encoding, status), responses in sorted(static_figures_responses.items()):
+            lines.append(f"f1data_static_figure_sent_bytes_total{formatLabels({'figure': name, 'encoding': encoding, 'status': status})} {responses['bytes']}")
+        lines += [
+            "# HELP f1data_precomputed_builds_total Per-version tables built from scratch, updated with the latest seasons or reused from the previous version.",
+            "# TYPE f1data_precomputed_builds_total counter"
+        ]
+        for (builder, kind), count in sorted(precomputed_builds.items()):
+            lines.append(f"f1data_precomputed_builds_total{formatLabels({'builder': builder, 'kind': kind})} {count}")
+
+    lines += [
+        "# HELP f1data_cache_lookups_total Lookups of the callbacks outputs cache.",
+        "# TYPE f1data_cache_lookups_total counter"
+    ]
+    for functionName, counters in sorted(cacheStats["functions"].items()):
+        for result in ["hits", "misses"]:
+            lines.append(f"f1data_cache_lookups_total{formatLabels({'callback': functionName, 'result': result})} {counters[result]}")
+    lines += [
+        "# HELP f1data_cache_hit_ratio Hits over lookups of the callbacks outputs cache.",
+        "# TYPE f1data_cache_hit_ratio gauge",
+        f"f1data_cache_hit_ratio {cacheStats['hitRatio']}",
+        "# HELP f1data_cache_evictions_total Outputs evicted from the cache.",
+        "# TYPE f1data_cache_evictions_total counter",
+        f"f1data_cache_evictions_total {cacheStats['evictions']}",
+        "# HELP f1data_cache_entries Outputs in the cache.",
+        "# TYPE f1data_cache_entries gauge",
+        f"f1data_cache_entries {cacheStats['entries']}",
+        "# HELP f1data_cache_bytes Serialized size of the outputs in the cache.",
+        "# TYPE f1data_cache_bytes gauge",
+        f"f1data_cache_bytes {cacheStats['bytes']}",
+        "# HELP f1data_dataset_info f1db release currently served.",
+        "# TYPE f1data_dataset_info gauge",
+        f"f1data_dataset_info{formatLabels({'version': version})} 1"
+    ]
+    return "\n".join(lines) + "\n"
+
+
+# Forget every observation
+def clearMetrics():
+    with metrics_lock:
+        histograms.clear()
+        static_figures_responses.clear()
+        static_figures_sizes.clear()
+        precomputed_builds.clear()
@@ -0,0 +1,120 @@
+# File      BACKEND | f1db_query
+# Author    Matteo Naccarato
+
+import numpy as np
+import pandas as pd
+
+import backend.f1db_tables as f1db_tables
+import backend.f1db_aggregates as f1db_aggregates
+
+
+# ==================INDEXES==================
+# A dataframe indexed by {col} is stored sorted by ({col}, year) (ties keep their order), so that:
+#   - the rows of each key (e.g. a driver) are contiguous, found by binary search on the sorted keys
+#   - the rows of a key in a range of years are a contiguous part of them, found by binary search as well
+# Categorical columns (see f1db_tables.id_columns) are indexed by their integer codes
+
+YEAR_SPAN = 10_000 # keys and years are searched together as {key rank} * YEAR_SPAN + year
+
+# @returns -> index of {df} by {col}:
+#               - "df": {df} sorted by ({col}, year), read-only, original index labels are kept
+#               - "keys": sorted keys, the rows of the i-th one are [offsets[i], offsets[i+1])
+#               - "dtype": dtype of the categorical {col} (None otherwise)
+#               - "ranks": {key rank} * YEAR_SPAN + year of every row, sorted (None if {df} has no "year" column)
+#               - "firstYear", "lastYear": first and last year of each key (None if {df} has no "year" column)
+def buildIndex(df, col):
+    values = df[col]
+    dtype = values.dtype if isinstance(values.dtype, pd.CategoricalDtype) else None
+    keys = values.cat.codes.to_numpy() if dtype is not None else values.to_numpy()
+    years = df["year"].to_numpy() if "year" in df.columns else None
+
+    order = np.lexsort((years, keys)) if years is not None else np.argsort(keys, kind="stable")
+    keys = keys[order]
+    uniques, starts, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    offsets = np.append(starts, len(keys))
+    years = years[order] if years is not None else None
+
+    return {
+        "df": f1db_tables.setReadOnly(df.take(order)),
+        "keys": uniques,
+        "offsets": offsets,
+        "dtype": dtype,
+        "ranks": inverse * YEAR_SPAN + years if years is not None else None,
+        "firstYear": years[offsets[:-1]] if years is not None else None,
+        "lastYear": years[offsets[1:] - 1] if years is not None else None
+    }
+
+# @returns -> index of the f1db table {fileName} by {col}, built once per f1db version (reused if the table did not change)
+@f1db_aggregates.perVersion(tables=lambda fileName, col: {fileName: None})
+def getTableIndex(fileName, col):
+    return buildIndex(f1db_tables.getTable(fileName), col)
+
+# ===========================================
+
+
+# ==================QUERIES==================
+
+# @returns -> positions in {index}["keys"] of the {values} which are indexed, following the order of {values}
+def getKeyPositions(index, values):
+    keys = index["keys"]
+    if index["dtype"] is not None:
+        values = index["dtype"].categories.get_indexer(list(values))
+        values = values[values >= 0] # unknown ids (-1 is also the code of NaN)
+    else:
+        values = np.asarray(values)
+    positions = np.searchsorted(keys, values)
+    found = positions < len(keys)
+    found[found] = keys[positions[found]] == values[found]
+    return positions[found]
+
+# @returns -> [start, end) of the rows of the keys at {keyPositions} whose year is in {yearRange} ([first, last], every year if None)
+def getRowRanges(index, keyPositions, yearRange=None):
+    if yearRange is None:
+        return index["offsets"][keyPositions], index["offsets"][keyPositions + 1]
+    starts = np.searchsorted(index["ranks"], keyPositions * YEAR_SPAN + yearRange[0], side="left")
+    ends = np.searchsorted(index["ranks"], keyPositions * YEAR_SPAN + yearRange[1], side="right")
+    return starts, np.maximum(ends, starts)
+
+# @returns -> positions of the rows in the ranges [starts[i], ends[i]), one range after the other
+def getRangesPositions(starts, ends):
+    lengths = ends - starts
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+# @returns -> positions (in the indexed dataframe) of the rows whose key is in {values} (every key if None),
+#               and whose year is in {yearRange} ([first, last], every year if None).
+#               Rows are grouped by key following the order of {values}, each key with its rows ordered by year
+def getPositions(index, values=None, yearRange=None):
+    keyPositions = np.arange(len(index["keys"])) if values is None else getKeyPositions(index, values)
+    return getRangesPositions(*getRowRanges(index, keyPositions, yearRange))
+
+# @returns -> rows of the indexed dataframe (see getPositions)
+def select(index, values=None, yearRange=None):
+    if values is None and yearRange is None:
+        return index["df"].copy(deep=False)
+    keyPositions = np.arange(len(index["keys"])) if values is None else getKeyPositions(index, values)
+    starts, ends = getRowRanges(index, keyPositions, yearRange)
+    if len(keyPositions) == 1: # contiguous rows
+        return index["df"].iloc[starts[0]:ends[0]].copy(deep=False)
+    return index["df"].take(getRangesPositions(starts, ends))
+
+# @returns -> values of the keys at {keyPositions} (ids for categorical columns)
+def getKeys(index, keyPositions):
+    keys = index["keys"][keyPositions]
+    return index["dtype"].categories[keys] if index["dtype"] is not None else keys
+
+# @returns -> positions in {index}["keys"] of the keys with at least one row in {yearRange} ([first, last]), without duplicates.
+#               They are ordered by their first row in the range: by year, then as in the dataframe which was indexed
+#               (e.g. by position in the standings of that year)
+def getKeysInYearRange(index, yearRange):
+    # Only the keys whose seasons span over the range may have a row in it
+    keyPositions = np.flatnonzero((index["firstYear"] <= yearRange[1]) & (index["lastYear"] >= yearRange[0]))
+    starts = np.searchsorted(index["ranks"], keyPositions * YEAR_SPAN + yearRange[0], side="left")
+    ends = np.searchsorted(index["ranks"], keyPositions * YEAR_SPAN + yearRange[1], side="right")
+    found = starts < ends
+    keyPositions, starts = keyPositions[found], starts[found]
+
+    years = index["ranks"][starts] % YEAR_SPAN
+    labels = index["df"].index.to_numpy()[starts]
+    return keyPositions[np.lexsort((labels, years))]
+
+# ===========================================
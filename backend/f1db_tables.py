@@ -0,0 +1,410 @@
+# File      BACKEND | f1db_tables
+# Author    Matteo Naccarato
+
+import glob
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+import backend.f1db_utils as f1db_utils
+import backend.f1db_metrics as f1db_metrics
+
+
+# Canonical column names, the same ones used all over the backend to merge tables
+# (e.g. "id" of f1db-drivers.csv is always referred to as "driverId")
+canonical_renames = {
+    f1db_utils.circuits: {"id": "circuitId", "name": "circuitName"},
+    f1db_utils.constructors: {"id": "constructorId", "name": "constructorName"},
+    f1db_utils.continents: {"id": "continentId", "name": "continentName"},
+    f1db_utils.countries: {"id": "countryId", "name": "countryName"},
+    f1db_utils.drivers_info: {"id": "driverId", "name": "driverName"},
+    f1db_utils.grands_prix: {"id": "grandPrixId", "name": "grandPrixName"},
+    f1db_utils.races: {"id": "raceId"}
+}
+
+# Same dtype for the same column in every table
+# (e.g. "positionText" is inferred as int64 for practice results but as object for race results)
+columns_dtypes = {
+    "raceId": "int64",
+    "year": "int64",
+    "round": "int64",
+    "positionDisplayOrder": "int64",
+    "positionNumber": "float64",
+    "positionText": "object",
+    "points": "float64",
+    "time": "object",
+    "timeMillis": "float64",
+    "q1": "object",
+    "q1Millis": "float64",
+    "q2": "object",
+    "q2Millis": "float64",
+    "q3": "object",
+    "q3Millis": "float64",
+    "gap": "object",
+    "gapMillis": "float64",
+    "interval": "object",
+    "intervalMillis": "float64",
+    "date": "object"
+}
+
+# ID columns stored as categoricals (int32 codes + slugs), sharing the same categories in every table
+# so that merges, isin and groupbys on them work on integers. The slugs are still the displayed values.
+# The categories of each column are the ids of its entity table, sorted (same order as the slugs)
+id_columns = {
+    "driverId": f1db_utils.drivers_info,
+    "constructorId": f1db_utils.constructors,
+    "circuitId": f1db_utils.circuits,
+    "grandPrixId": f1db_utils.grands_prix,
+    "countryId": f1db_utils.countries
+}
+
+CACHE_MANIFEST = "columns.json"
+UNVERSIONED = "unversioned"
+
+# SNAPSHOTS: the tables of one f1db version ({"version": ..., "tables": {fileName: dataframe}, "idDtypes": {column: dtype}}).
+# A new version is loaded in a new snapshot, which replaces the current one only once it is ready (see reload).
+# Until then it also keeps the "previous" snapshot, and the "changes" of its tables from it (see getChanges)
+current_snapshot = None
+pinned = threading.local() # snapshot used by the current thread/request, if any
+tables_lock = threading.Lock()
+reload_lock = threading.Lock()
+reload_hooks = []
+
+WATCH_INTERVAL = float(os.environ.get("F1DB_WATCH_INTERVAL", 30)) # seconds between two checks of {last_version_file}
+
+
+# @returns -> f1db release currently on disk (e.g. "v2024.9.0")
+def readVersion():
+    try:
+        with open(f1db_utils.last_version_file, 'r') as file:
+            return file.read().strip() or UNVERSIONED
+    except FileNotFoundError:
+        return UNVERSIONED
+
+
+def newSnapshot(version, previous=None):
+    return {"version": version, "tables": {}, "idDtypes": None, "previous": previous, "changes": {}}
+
+# @returns -> snapshot pinned by the current thread, the current one otherwise
+def getSnapshot():
+    global current_snapshot
+    snapshot = getattr(pinned, "snapshot", None)
+    if snapshot is None:
+        snapshot = current_snapshot
+        if snapshot is None:
+            with tables_lock:
+                if current_snapshot is None:
+                    current_snapshot = newSnapshot(readVersion())
+                snapshot = current_snapshot
+    return snapshot
+
+# Every later getTable/getVersion of the current thread uses {snapshot} (the current one if None),
+# even if a new version is swapped in meanwhile (e.g. for the whole duration of a request)
+def pinSnapshot(snapshot=None):
+    pinned.snapshot = snapshot if snapshot is not None else getSnapshot()
+
+def unpinSnapshot(*_):
+    pinned.snapshot = None
+
+
+# @returns -> f1db release of the loaded tables
+def getVersion():
+    return getSnapshot()["version"]
+
+
+# @returns -> folder of the csv files of {version}: its release folder in {releases_folder}, published as a whole by get_data.
+#               The csv files in {folder} (e.g. the ones shipped with the repository) otherwise, until a release is downloaded
+def getCsvFolder(version):
+    release = f"{f1db_utils.releases_folder}/{version}"
+    return release if os.path.isdir(release) else f1db_utils.folder
+
+# @returns -> dataframe of {fileName} of {version} parsed from its csv, with canonical dtypes and column names
+def readTableCsv(fileName, version):
+    df = pd.read_csv(f"{getCsvFolder(version)}/{fileName}", dtype=columns_dtypes)
+    df.rename(columns=canonical_renames.get(fileName, {}), inplace=True)
+    return df
+
+
+# @returns -> file names of every f1db table of {version}
+def getTableNames(version):
+    return [os.path.basename(csv_path) for csv_path in sorted(glob.glob(f"{getCsvFolder(version)}/*.csv"))]
+
+
+# ==================BINARY CACHE==================
+# Every table is stored column by column as .npy files in {cache_folder}/{version}/{fileName}/
+#   - numeric and boolean columns as they are, so that they can be memory-mapped
+#   - object columns as int32 codes (memory-mapped, -1 is NaN) + their unique values,
+#     the ones in {idDtypes} are read as categoricals (their codes remapped onto the shared categories)
+def getCachePath(version):
+    return f"{f1db_utils.cache_folder}/{version}"
+
+def writeTableCache(df, path):
+    os.makedirs(path)
+    columns = []
+    for idx, col in enumerate(df.columns):
+        values = df[col].to_numpy()
+        if values.dtype == object:
+            codes, uniques = pd.factorize(values)
+            np.save(f"{path}/{idx}.codes.npy", codes.astype(np.int32))
+            np.save(f"{path}/{idx}.uniques.npy", np.asarray(uniques, dtype=object), allow_pickle=True)
+            columns.append({"name": col, "kind": "object"})
+        else:
+            np.save(f"{path}/{idx}.npy", values)
+            columns.append({"name": col, "kind": "numpy"})
+    with open(f"{path}/{CACHE_MANIFEST}", 'w') as file:
+        json.dump(columns, file)
+
+def readTableCache(path, idDtypes={}):
+    with open(f"{path}/{CACHE_MANIFEST}", 'r') as file:
+        columns = json.load(file)
+    data = {}
+    for idx, column in enumerate(columns):
+        if column["kind"] == "object":
+            codes = np.load(f"{path}/{idx}.codes.npy", mmap_mode="r")
+            uniques = np.load(f"{path}/{idx}.uniques.npy", allow_pickle=True)
+            dtype = idDtypes.get(column["name"])
+            if dtype is not None:
+                remap = np.append(dtype.categories.get_indexer(uniques), -1).astype(np.int32)
+                data[column["name"]] = pd.Categorical.from_codes(remap[codes], dtype=dtype)
+            else:
+                data[column["name"]] = np.append(uniques, np.nan)[codes] # code -1 => last element (NaN)
+        else:
+            data[column["name"]] = np.asarray(np.load(f"{path}/{idx}.npy", mmap_mode="r"))
+    return pd.DataFrame(data, copy=False)
+
+# Only the version in {last_version_file} is sure to have its csv files on disk (see getCsvFolder): any other version can only be read from its binary cache
+def checkOnDisk(version):
+    on_disk = readVersion()
+    if version != on_disk:
+        raise RuntimeError(f"f1db {version} is not on disk anymore ({on_disk} is)")
+
+# One-time conversion of every csv of {version} (the one on disk) into the binary cache
+def buildCache(version):
+    path = getCachePath(version)
+    if not os.path.isdir(path):
+        checkOnDisk(version)
+        os.makedirs(f1db_utils.cache_folder, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix=f".{version}-", dir=f1db_utils.cache_folder)
+        try:
+            for fileName in getTableNames(version):
+                writeTableCache(readTableCsv(fileName, version), f"{tmp_path}/{fileName}")
+            os.rename(tmp_path, path) # fails if another process has already built the same version
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+# Remove the binary cache and the release folder of every version but {versions} (the ones being built are left alone)
+def pruneCaches(versions):
+    for parent in [f1db_utils.cache_folder, f1db_utils.releases_folder]:
+        try:
+            stored = os.listdir(parent)
+        except FileNotFoundError:
+            continue
+        for old_version in stored:
+            if old_version not in versions and not old_version.startswith("."):
+                shutil.rmtree(f"{parent}/{old_version}", ignore_errors=True)
+
+# ===============================================
+
+
+# @returns -> dataframe of {fileName} of {version} with canonical dtypes and column names (ID columns as {idDtypes}).
+#               It is read from the binary cache of {version} (built if missing), falling back to the csv
+#               (e.g. unknown version, read-only file system). Both only if {version} is still the one on disk
+def readTable(fileName, version, idDtypes={}):
+    try:
+        if version == UNVERSIONED:
+            raise FileNotFoundError(f1db_utils.last_version_file)
+        return readTableCache(f"{buildCache(version)}/{fileName}", idDtypes)
+    except (OSError, ValueError):
+        checkOnDisk(version)
+        df = readTableCsv(fileName, version)
+        for col in df.columns.intersection(list(idDtypes)):
+            df[col] = df[col].astype(idDtypes[col])
+        return df
+
+# @returns -> categorical dtype of every ID column of {snapshot}, built from the entity tables the first time
+def getIdDtypes(snapshot):
+    if snapshot["idDtypes"] is None:
+        snapshot["idDtypes"] = {
+            col: pd.CategoricalDtype(np.sort(readTable(fileName, snapshot["version"])[col].dropna().unique()))
+            for col, fileName in id_columns.items()
+        }
+    return snapshot["idDtypes"]
+
+# @returns -> dataframe of {fileName} of {snapshot} with canonical dtypes, column names, categorical IDs and read-only arrays
+def loadTable(fileName, snapshot):
+    return setReadOnly(readTable(fileName, snapshot["version"], getIdDtypes(snapshot)))
+
+
+# Shared dataframes are never written in place: their arrays are made read-only, so that an assignment into one of their columns
+#   (e.g. df.loc[...] = ..., df.iloc[...] = ...) raises ValueError instead of corrupting every other reader.
+#   Callers add or replace whole columns instead (df[col] = ..., df.assign(...))
+def setReadOnly(df):
+    for block in df._mgr.blocks:
+        values = block.values
+        if isinstance(values, pd.Categorical):
+            values = values._ndarray # codes
+        values.flags.writeable = False
+    return df
+
+
+# @returns -> shared {fileName} dataframe, loaded from disk only the first time it is requested.
+#               The returned dataframe is a shallow copy: callers can freely rename/drop/add/replace columns,
+#               but must never assign into the shared ones in place (it raises ValueError, see setReadOnly)
+def getTable(fileName):
+    with f1db_metrics.stage("load"):
+        snapshot = getSnapshot()
+        df = snapshot["tables"].get(fileName)
+        if df is None:
+            with tables_lock:
+                df = snapshot["tables"].get(fileName)
+                if df is None:
+                    df = loadTable(fileName, snapshot)
+                    snapshot["tables"][fileName] = df
+        return df.copy(deep=False)
+
+
+# Load every table of the current snapshot now instead of on first use
+# (e.g. before forking the server workers, that will all share them)
+def loadTables():
+    for fileName in getTableNames(getVersion()):
+        getTable(fileName)
+
+
+# Forget every loaded table (e.g. a new f1db version has been downloaded), they are lazily loaded again
+def clearTables():
+    global current_snapshot
+    with tables_lock:
+        current_snapshot = None
+
+
+# ==================RELEASE DIFF==================
+# A new f1db release mostly adds the races of the current season: the rows of the older seasons do not change.
+# The changes of a table from the previous snapshot (on some of its columns) are one of:
+#   - {"status": UNCHANGED}
+#   - {"status": SEASONS, "fromYear": year}: only the rows of the seasons since {year} differ (added, removed or updated)
+#   - {"status": CHANGED}: anything else (e.g. rows of older seasons, tables without "year", new ids, no previous snapshot)
+UNCHANGED = "unchanged"
+SEASONS = "seasons"
+CHANGED = "changed"
+
+# @returns -> values of {series} comparable between two snapshots (codes of categoricals, their categories are the same)
+def getComparableValues(series):
+    return series.cat.codes.to_numpy() if isinstance(series.dtype, pd.CategoricalDtype) else series.to_numpy()
+
+# @returns -> changes from {old} to {new} of their {columns} (every column if None, "year" is always compared).
+#               Both tables must be sorted by year (as every f1db table with a "year" column)
+def diffTable(old, new, columns=None):
+    columns = list(new.columns if columns is None else columns)
+    if "year" in new.columns and "year" not in columns:
+        columns.append("year")
+    if any(col not in old.columns or col not in new.columns or old[col].dtype != new[col].dtype for col in columns):
+        return {"status": CHANGED}
+    
+    # First row which differs (the rows of the seasons before its year are all before it)
+    length = min(len(old), len(new))
+    differs = np.zeros(length, dtype=bool)
+    for col in columns:
+        old_values = getComparableValues(old[col])[:length]
+        new_values = getComparableValues(new[col])[:length]
+        differs |= ~((old_values == new_values) | (pd.isna(old_values) & pd.isna(new_values)))
+    first = int(np.argmax(differs)) if differs.any() else length
+    if first == len(old) == len(new):
+        return {"status": UNCHANGED}
+    
+    if "year" not in columns or not (old["year"].is_monotonic_increasing and new["year"].is_monotonic_increasing):
+        return {"status": CHANGED}
+    fromYear = min(int(df["year"].iat[first]) for df in (old, new) if first < len(df))
+    return {"status": SEASONS, "fromYear": fromYear}
+
+# @returns -> changes of the {columns} of {fileName} (see diffTable) from the previous snapshot to the pinned one,
+#               computed once. Only a snapshot being loaded (see reload) has a previous one
+def getChanges(fileName, columns=None):
+    snapshot = getSnapshot()
+    key = (fileName, None if columns is None else tuple(columns))
+    with tables_lock:
+        changes = snapshot["changes"].get(key)
+        previous = snapshot["previous"]
+    if changes is not None:
+        return changes
+    
+    if previous is None or fileName not in previous["tables"] or previous["idDtypes"] != getIdDtypes(snapshot):
+        changes = {"status": CHANGED} # e.g. new drivers: the codes of every ID column are different
+    else:
+        changes = diffTable(previous["tables"][fileName], getTable(fileName), columns)
+    with tables_lock:
+        snapshot["changes"][key] = changes
+    return changes
+
+# @returns -> version of the previous snapshot of the pinned one (None if it has none)
+def getPreviousVersion():
+    previous = getSnapshot()["previous"]
+    return previous["version"] if previous is not None else None
+
+# ===============================================
+
+
+# ==================HOT RELOAD==================
+
+# {hook}() is run against every new snapshot before it is swapped in
+# (e.g. to build the derived tables and static figures of the new version)
+def addReloadHook(hook):
+    reload_hooks.append(hook)
+
+# Load the version on disk, if it is not the current one, in background to the requests:
+# its tables are loaded and the reload hooks run in a new snapshot, which is then atomically swapped in.
+# Meanwhile, the tables derived from the current one can be updated instead of rebuilt (see f1db_aggregates.perVersion).
+# Requests already running keep their pinned snapshot, if anything fails the current one is kept.
+# Once swapped in, the binary caches and releases older than the replaced version are removed (requests still running may read the replaced one)
+# @returns -> True if a new version has been swapped in
+def reload():
+    global current_snapshot
+    with reload_lock:
+        version = readVersion()
+        if version == getSnapshot()["version"]:
+            return False
+        
+        snapshot = newSnapshot(version, getSnapshot())
+        previous = getattr(pinned, "snapshot", None)
+        pinSnapshot(snapshot)
+        try:
+            for fileName in getTableNames(version):
+                snapshot["tables"][fileName] = loadTable(fileName, snapshot)
+            for hook in reload_hooks:
+                hook()
+        except Exception as e:
+            print(f"f1-data > Reload failed\t\t({version}, {type(e).__name__}: {e})")
+            return False
+        finally:
+            pinned.snapshot = previous
+        
+        with tables_lock:
+            replaced = snapshot["previous"]["version"]
+            snapshot["previous"] = None # its tables are released once the requests still using them are over
+            current_snapshot = snapshot
+        pruneCaches([version, replaced])
+        print(f"f1-data > Reloaded\t\t\t({version})")
+        return True
+
+def watchVersion(interval):
+    while True:
+        time.sleep(interval)
+        reload()
+
+# Check {last_version_file} every {interval} seconds and reload a new version as soon as it appears
+# (e.g. downloaded by get_data, or by another process)
+# @returns -> the watcher thread
+def startVersionWatcher(interval=WATCH_INTERVAL):
+    thread = threading.Thread(target=watchVersion, args=(interval,), name="f1db-version-watcher", daemon=True)
+    thread.start()
+    return thread
+
+# ==============================================
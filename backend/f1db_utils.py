@@ -7,6 +7,10 @@ import pandas as pd
 import plotly.express as px
 
 folder = 'f1db-csv'
+cache_folder = f'{folder}/.cache'
+releases_folder = f'{folder}/.releases'
+last_version_file = "f1db_last_version_file.txt"
+last_etag_file = "f1db_last_etag_file.txt"
 
 constructors = 'f1db-constructors.csv'
 continents = 'f1db-continents.csv'
@@ -14,10 +18,14 @@ countries = 'f1db-countries.csv'
 circuits = 'f1db-circuits.csv'
 drivers_info = 'f1db-drivers.csv'
 grands_prix = "f1db-grands-prix.csv"
+fastest_laps = "f1db-races-fastest-laps.csv"
 qualifying_results = 'f1db-races-qualifying-results.csv'
 races_results = "f1db-races-race-results.csv"
+pit_stops = "f1db-races-pit-stops.csv"
 races = "f1db-races.csv"
+seasons_constructor_standings = "f1db-seasons-constructor-standings.csv"
 seasons_driver_standings = "f1db-seasons-driver-standings.csv"
+seasons_entrants_constructors = 'f1db-seasons-entrants-constructors.csv'
 seasons_entrants_drivers = 'f1db-seasons-entrants-drivers.csv'
 
 MONTH_END_SEASON = 12
@@ -98,22 +106,39 @@ def getHoverlabel(fontSize = HOVERLABEL_FONT_SIZE_DEFAULT):
         font_size=fontSize,
     )
 
+# @returns -> data of a dcc.Store shown by the clientside callbacks (assets/clientside.js, f1data.filterFigure), so that moving a slider
+#               never reaches the server. {figure} is built once with every point, {values} has one value per point of each trace
+#               (e.g. the count of each bar) and only the points whose value is over the slider threshold ({minValue} if not set)
+#               or in the slider range are displayed, {empty} if no point is left (None = the filtered figure anyway).
+#               Without {values} the figure is displayed as it is (e.g. trend graphs)
+def getFilterableFigure(figure, values=None, minValue=0, empty=None):
+    values = None if values is None else pd.Series(values).tolist()
+    return {
+        "figure": figure,
+        "values": values,
+        "min": minValue,
+        "max": max(values, default=0) if values is not None else 0,
+        "empty": empty
+    }
+
 # ===========================================
 
 
 # ==================FUNCTIONS==================
 
-# Function to subset and order a pandas dataframe for a long format
-# It does NOT change colors when adding new elements to a graph
-def order_df(df_input, order_by, order):
-    df_output=pd.DataFrame()
-    for var in order:    
-        df_append=df_input[df_input[order_by]==var].copy()
-        df_output = pd.concat([df_output, df_append])
-    return(df_output)
+def isCurrentSeasonOver():
+    return (datetime.now().month >= MONTH_END_SEASON) & (datetime.now().day >= DAY_END_SEASON)
+
+# @returns -> [current year, isCurrentSeasonOver()], what the WDCs of the current season depend on.
+#               Tables built once per version with the WDCs mask are keyed on it, so that they are built again when it changes (e.g. at new year)
+def getCurrentSeason():
+    return [datetime.now().year, isCurrentSeasonOver()]
+
+def getWdcsMask(df, currentYear, currentSeasonOver):
+    return (df["year"] < currentYear) | currentSeasonOver
 
 def currentSeasonCheckMask(df, performanceType):
-    return (df["year"] < datetime.now().year) | ((datetime.now().month >= MONTH_END_SEASON) & (datetime.now().day >= DAY_END_SEASON)) if performanceType == PerformanceType.WDCS.value else True
+    return getWdcsMask(df, *getCurrentSeason()) if performanceType == PerformanceType.WDCS.value else True
 
 def get_p1_mask(df, performanceType):
     # If "WDCS" , current year must not count as won world driver championship, to take into account the data:
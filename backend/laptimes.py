@@ -0,0 +1,149 @@
+# File      BACKEND | LAP TIMES
+# Author    Matteo Naccarato
+
+import numpy as np
+import pandas as pd
+
+import backend.f1db_utils as f1db_utils
+import backend.f1db_tables as f1db_tables
+import backend.f1db_aggregates as f1db_aggregates
+import backend.f1db_query as f1db_query
+import backend.circuits as circuits
+
+
+# LABELS DICT
+labels_dict = {
+    **circuits.labels_dict,
+    "speed": "Fastest Lap Speed (km/h)",
+    "deltaPercent": "Fastest Lap vs Pole (%)",
+    "era": "Era"
+}
+
+# ERAS: first season of each era of the regulations, the trend of the fastest laps of each circuit is fitted separately in each one
+ERAS = {
+    1950: "Front-engined cars",
+    1961: "1.5 L engines",
+    1966: "3 L engines",
+    1977: "Ground effect",
+    1983: "Turbo engines",
+    1989: "3.5 L engines",
+    1995: "3 L engines (V10)",
+    2006: "2.4 L V8 engines",
+    2014: "Turbo-hybrid engines",
+    2022: "Ground effect (2022)"
+}
+ERAS_FIRST_YEARS = np.array(list(ERAS))
+ERAS_NAMES = np.array(list(ERAS.values()), dtype=object)
+MIN_TREND_SEASONS = 3 # fewer races of a circuit in an era are not fitted
+
+
+# FUNCTIONS
+# Columns the lap times are derived from (the pole lap times, see circuits.getPoleTimes, and the fastest laps)
+lap_times_tables = {
+    **circuits.pole_times_tables,
+    f1db_utils.fastest_laps: ["raceId", "positionNumber", "driverId", "lap", "time", "timeMillis"]
+}
+
+# @returns -> one row per race of the seasons since {fromYear} (sorted by year) with its fastest lap (time, driver, average "speed" in km/h)
+#               and its pole lap ("poleTime", "poleMillis", "poleDriverName"), "deltaMillis" and "deltaPercent" from the pole to the fastest lap.
+#               Built once per f1db version, only the latest seasons are merged again when a new one is loaded
+@f1db_aggregates.perVersion(tables=lap_times_tables, seasonal=True)
+def getLapTimes(fromYear=None):
+    df = f1db_tables.getTable(f1db_utils.fastest_laps)
+    df = f1db_aggregates.getSeasonsSince(df[["year", "raceId", "positionNumber", "driverId", "lap", "time", "timeMillis"]], fromYear)
+    df = df[df["positionNumber"] == 1].drop_duplicates(subset="raceId").drop(columns=["positionNumber"]) # shared fastest laps: first one
+
+    df_races = f1db_tables.getTable(f1db_utils.races)
+    df_races.drop(columns=df_races.columns.difference(["raceId", "circuitId", "officialName", "courseLength"]), inplace=True)
+    df_drivers_info = f1db_tables.getTable(f1db_utils.drivers_info)
+    df_drivers_info.drop(columns=df_drivers_info.columns.difference(["driverId", "driverName"]), inplace=True)
+    df_circuits = f1db_tables.getTable(f1db_utils.circuits)
+    df_circuits.drop(columns=df_circuits.columns.difference(["circuitId", "circuitName"]), inplace=True)
+    df_poles = f1db_aggregates.getSeasonsSince(circuits.getPoleTimes(), fromYear)[["raceId", "time", "timeMillis", "driverName"]]
+    df_poles = df_poles.rename(columns={"time": "poleTime", "timeMillis": "poleMillis", "driverName": "poleDriverName"})
+
+    df = pd.merge(df, df_races, on="raceId", how="left")
+    df = pd.merge(df, df_drivers_info, on="driverId", how="left")
+    df = pd.merge(df, df_circuits, on="circuitId", how="left")
+    df = pd.merge(df, df_poles, on="raceId", how="left")
+
+    df["speed"] = df["courseLength"] / df["timeMillis"] * 3_600_000
+    df["deltaMillis"] = df["timeMillis"] - df["poleMillis"]
+    df["deltaPercent"] = df["deltaMillis"] / df["poleMillis"] * 100
+
+    df.drop(columns=["driverId", "courseLength"], inplace=True)
+    return df.reset_index(drop=True)
+
+# @returns -> lap times of every race (see getLapTimes) as arrays keyed by circuit and year, built once per f1db version:
+#               - "index": lap times indexed by circuitId (see f1db_query.buildIndex), sorted by circuit and then by year
+#               - one array per column of the index (same order), and the "era" (index in ERAS) of each race
+#               - "trends": linear fit of the fastest lap speed over the seasons, for each circuit and era with at least
+#                   {MIN_TREND_SEASONS} races: "circuit" (key position in the index), "era", "firstYear", "lastYear", "races",
+#                   "slope" (km/h per season) and "intercept" (km/h in the first season of the era), sorted by circuit and era
+@f1db_aggregates.perVersion(tables=lap_times_tables)
+def getLapTimesStore():
+    index = f1db_query.buildIndex(getLapTimes(), "circuitId")
+    store = {col: index["df"][col].to_numpy() for col in index["df"].columns}
+    store["index"] = index
+    store["era"] = np.searchsorted(ERAS_FIRST_YEARS, store["year"], side="right") - 1
+
+    # Least squares of every (circuit, era) at once, from the sums of each group
+    circuit = np.repeat(np.arange(len(index["keys"])), np.diff(index["offsets"]))
+    groups = circuit * len(ERAS) + store["era"]
+    fitted = ~np.isnan(store["speed"])
+    groups, x, y = groups[fitted], (store["year"] - ERAS_FIRST_YEARS[store["era"]])[fitted].astype(np.float64), store["speed"][fitted]
+    sums = {name: np.bincount(groups, weights=weights, minlength=len(index["keys"]) * len(ERAS))
+            for name, weights in {"n": None, "x": x, "y": y, "xx": x * x, "xy": x * y}.items()}
+    denominator = sums["n"] * sums["xx"] - sums["x"] ** 2
+    trends = np.flatnonzero((sums["n"] >= MIN_TREND_SEASONS) & (denominator > 0))
+    slope = (sums["n"] * sums["xy"] - sums["x"] * sums["y"])[trends] / denominator[trends]
+
+    firstYear = np.full(len(sums["n"]), np.iinfo(np.int64).max)
+    lastYear = np.full(len(sums["n"]), np.iinfo(np.int64).min)
+    np.minimum.at(firstYear, groups, store["year"][fitted])
+    np.maximum.at(lastYear, groups, store["year"][fitted])
+    store["trends"] = {
+        "circuit": trends // len(ERAS),
+        "era": trends % len(ERAS),
+        "firstYear": firstYear[trends],
+        "lastYear": lastYear[trends],
+        "races": sums["n"][trends].astype(np.int64),
+        "slope": slope,
+        "intercept": (sums["y"][trends] - slope * sums["x"][trends]) / sums["n"][trends]
+    }
+    
+    for values in [store["era"], *store["trends"].values()]:
+        values.flags.writeable = False
+    return store
+
+# @returns -> dataframe of {selected_circuits} with the fastest lap and the pole lap of each race (see getLapTimes),
+#               only the years in {yearRange} if not None. Circuits in the same order of {selected_circuits}, each one sorted by year
+def get_lap_times(selected_circuits, yearRange=None):
+    store = getLapTimesStore()
+    positions = f1db_query.getPositions(store["index"], selected_circuits, yearRange)
+    df = pd.DataFrame({col: store[col][positions] for col in store["index"]["df"].columns})
+    df["era"] = ERAS_NAMES[store["era"][positions]]
+    return df
+
+# @returns -> dataframe of the era trends (see getLapTimesStore) of {selected_circuits}, three rows per trend: its first and last season
+#               with the fitted "speed", then an empty one (so that the trends of a circuit are a single line, broken between the eras).
+#               Each row has the "slope" (km/h per season) and the number of "races" of its trend, circuits in the same order of {selected_circuits}
+def get_era_trends(selected_circuits):
+    store = getLapTimesStore()
+    trends = store["trends"]
+    keyPositions = f1db_query.getKeyPositions(store["index"], selected_circuits)
+    starts, ends = np.searchsorted(trends["circuit"], keyPositions, side="left"), np.searchsorted(trends["circuit"], keyPositions, side="right")
+    selected = np.repeat(f1db_query.getRangesPositions(starts, ends), 3)
+
+    point = np.arange(len(selected)) % 3
+    years = np.where(point == 0, trends["firstYear"][selected], trends["lastYear"][selected]).astype(np.float64)
+    years[point == 2] = np.nan
+    eras = trends["era"][selected]
+    return pd.DataFrame({
+        "circuitName": store["circuitName"][store["index"]["offsets"][trends["circuit"][selected]]],
+        "era": ERAS_NAMES[eras],
+        "year": years,
+        "speed": trends["intercept"][selected] + trends["slope"][selected] * (years - ERAS_FIRST_YEARS[eras]),
+        "slope": trends["slope"][selected],
+        "races": trends["races"][selected]
+    })
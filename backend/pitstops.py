@@ -0,0 +1,251 @@
+# File      BACKEND | PIT STOPS
+# Author    Matteo Naccarato
+
+import numpy as np
+import pandas as pd
+
+import backend.f1db_utils as f1db_utils
+import backend.f1db_tables as f1db_tables
+import backend.f1db_aggregates as f1db_aggregates
+
+
+# LABELS DICT
+labels_dict = {
+    "year": "Year",
+    "round": "Round",
+    "officialName": "GP Name",
+    "constructorName": "Team",
+    "count": "Pit Stops",
+    "median": "Median Pit Stop Time (s)",
+    "best": "Best Pit Stop Time (s)",
+    "strategy": "Stops",
+    "share": "Drivers (%)",
+    "window": "Race Distance"
+}
+
+ALL_TEAMS = "All Teams"
+# Stops longer than this are not pit stops chosen by the team (red flags, repairs in the garage, ...):
+# they are counted, but left out of the durations
+MAX_STOP_MILLIS = 60_000
+# Lap windows: the race distance is split in {LAP_WINDOWS} equal parts
+LAP_WINDOWS = 5
+# Strategies: number of stops of a driver in a race, the last one is "or more"
+MAX_STRATEGY = 4
+# Durations distribution: quantiles computed for each group (0 = best stop)
+QUANTILES = {"best": 0.0, "p10": 0.1, "p25": 0.25, "median": 0.5, "p75": 0.75, "p90": 0.9}
+
+
+# FUNCTIONS
+# Columns the pit stops store is derived from
+pit_stops_tables = {
+    f1db_utils.pit_stops: ["raceId", "driverId", "constructorId", "stop", "lap", "timeMillis"],
+    f1db_utils.races: ["raceId", "round", "laps", "officialName"],
+    f1db_utils.constructors: ["constructorId", "constructorName"]
+}
+
+# @returns -> one row per pit stop of the seasons since {fromYear}, sorted by year, with the round and official name of its race
+#               and its lap window ("window", 0 = first {1/LAP_WINDOWS} of the race distance). "timeMillis" is NaN if longer than {MAX_STOP_MILLIS}.
+#               Built once per f1db version, only the latest seasons are merged again when a new one is loaded
+@f1db_aggregates.perVersion(tables=pit_stops_tables, seasonal=True)
+def getPitStops(fromYear=None):
+    df = f1db_tables.getTable(f1db_utils.pit_stops)
+    df = f1db_aggregates.getSeasonsSince(df[["year", "raceId", "driverId", "constructorId", "stop", "lap", "timeMillis"]], fromYear)
+
+    df_races = f1db_tables.getTable(f1db_utils.races)
+    df_races.drop(columns=df_races.columns.difference(["raceId", "round", "laps", "officialName"]), inplace=True)
+    df = pd.merge(df, df_races, on="raceId", how="left")
+
+    # Stops of a race without its number of laps are placed in the last window
+    laps = df["laps"].fillna(df["lap"]).to_numpy()
+    df["window"] = np.clip((df["lap"].to_numpy() - 1) * LAP_WINDOWS // laps, 0, LAP_WINDOWS - 1).astype(np.int8)
+    df["timeMillis"] = df["timeMillis"].where(df["timeMillis"] <= MAX_STOP_MILLIS)
+
+    df.drop(columns=["laps"], inplace=True)
+    return df.reset_index(drop=True)
+
+# @returns -> every pit stop (see getPitStops) as compact arrays keyed by year and constructor, built once per f1db version:
+#               - "years": seasons (sorted), the stops of the i-th one are [offsets[i], offsets[i+1])
+#               - "constructorIds", "constructorNames": every constructor (sorted by id), constructors are referred to by their index in it
+#               - "season" (index in "years"), "constructor", "race" (index in "raceIds"), "window", "millis": one element per stop,
+#                   sorted by year and then by constructor
+#               - "raceIds", "rounds", "officialNames": races with at least one stop (sorted)
+#               - "windows": year x constructor x lap window cube, with the number of stops of each cell
+#               - "strategies": year x constructor x number of stops cube, with the number of drivers who made that many stops in a race
+#                   (index 0 is unused, the last one counts {MAX_STRATEGY} stops or more)
+@f1db_aggregates.perVersion(tables=pit_stops_tables)
+def getPitStopsStore():
+    df = getPitStops()
+    constructorIds = df["constructorId"].cat.categories.to_numpy()
+    df_constructors = f1db_tables.getTable(f1db_utils.constructors)
+    constructorNames = df_constructors.set_index("constructorId")["constructorName"].reindex(constructorIds).fillna("").to_numpy()
+
+    year = df["year"].to_numpy()
+    constructor = df["constructorId"].cat.codes.to_numpy().astype(np.int32)
+    order = np.lexsort((constructor, year)) # stable: stops of the same constructor keep their race order
+    years, starts = np.unique(year[order], return_index=True)
+    raceId = df["raceId"].to_numpy()[order]
+    raceIds, race_starts, race = np.unique(raceId, return_index=True, return_inverse=True)
+
+    store = {
+        "years": years,
+        "offsets": np.append(starts, len(df)),
+        "constructorIds": constructorIds,
+        "constructorNames": constructorNames,
+        "season": np.repeat(np.arange(len(years), dtype=np.int16), np.diff(np.append(starts, len(df)))),
+        "constructor": constructor[order],
+        "race": race.astype(np.int32),
+        "window": df["window"].to_numpy()[order],
+        "millis": df["timeMillis"].to_numpy()[order],
+        "raceIds": raceIds,
+        "rounds": df["round"].to_numpy()[order][race_starts],
+        "officialNames": df["officialName"].to_numpy()[order][race_starts]
+    }
+    store["windows"] = np.zeros((len(years), len(constructorIds), LAP_WINDOWS), dtype=np.int64)
+    np.add.at(store["windows"], (store["season"], store["constructor"], store["window"]), 1)
+
+    # Strategies: stops of each driver in each race
+    driver = df["driverId"].cat.codes.to_numpy().astype(np.int64)[order]
+    _, entry_starts, stops = np.unique(raceId * len(df["driverId"].cat.categories) + driver, return_index=True, return_counts=True)
+    store["strategies"] = np.zeros((len(years), len(constructorIds), MAX_STRATEGY + 1), dtype=np.int64)
+    np.add.at(store["strategies"], (store["season"][entry_starts], store["constructor"][entry_starts], np.minimum(stops, MAX_STRATEGY)), 1)
+
+    for values in store.values():
+        values.flags.writeable = False
+    return store
+
+# @returns -> indexes in the store of {selected_constructors} (unknown constructors are ignored)
+def getPitStopsConstructors(selected_constructors):
+    store = getPitStopsStore()
+    selected_constructors = np.unique(np.asarray(selected_constructors, dtype=object))
+    idx = np.searchsorted(store["constructorIds"], selected_constructors)
+    found = idx < len(store["constructorIds"])
+    found[found] = store["constructorIds"][idx[found]] == selected_constructors[found]
+    return idx[found]
+
+# @returns -> [range of the seasons in {yearRange} (indexes of "years" in the store),
+#              indexes of {selected_constructors} (every constructor if empty or None),
+#              stops (indexes in the store) of those seasons and constructors]
+def getPitStopsSelection(yearRange, selected_constructors=None):
+    store = getPitStopsStore()
+    seasons = slice(np.searchsorted(store["years"], yearRange[0], side="left"), np.searchsorted(store["years"], yearRange[1], side="right"))
+    stops = np.arange(store["offsets"][seasons.start], store["offsets"][seasons.stop])
+    if not selected_constructors:
+        return [seasons, np.arange(len(store["constructorIds"])), stops]
+
+    constructors = getPitStopsConstructors(selected_constructors)
+    return [seasons, constructors, stops[np.isin(store["constructor"][stops], constructors)]]
+
+# @returns -> [groups, number of stops of each group, matrix (group x QUANTILES) of the durations of each group]
+#               of the stops whose group is {keys} and duration {millis} (stops without a duration are left out).
+#               Quantiles are linearly interpolated (as numpy.quantile), from a single sort of every stop
+def getDurationsDistribution(keys, millis):
+    valid = ~np.isnan(millis)
+    keys, millis = keys[valid], millis[valid]
+    order = np.lexsort((millis, keys))
+    keys, millis = keys[order], millis[order]
+    groups, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+
+    positions = starts[:, None] + (counts[:, None] - 1) * np.array(list(QUANTILES.values()))[None, :]
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.ceil(positions).astype(np.int64)
+    return [groups, counts, millis[lower] + (millis[upper] - millis[lower]) * (positions - lower)]
+
+
+# @returns -> dataframe with one row per group of the stops {stops}, grouped by {groups} ([(column, group of each stop, number of groups)]),
+#               with their number of timed stops ("count") and the QUANTILES of their durations in seconds
+def getDurationsDataframe(stops, groups):
+    store = getPitStopsStore()
+    keys = np.zeros(len(stops), dtype=np.int64)
+    for _, values, size in groups:
+        keys = keys * size + values
+    keys, counts, quantiles = getDurationsDistribution(keys, store["millis"][stops])
+
+    df = pd.DataFrame({"count": counts})
+    for col, _, size in reversed(groups):
+        df.insert(0, col, keys % size)
+        keys = keys // size
+    for idx, name in enumerate(QUANTILES):
+        df[name] = quantiles[:, idx] / 1000
+    return df
+
+# @returns -> groups of the stops {stops} by constructor (see getDurationsDataframe)
+def getConstructorsGroups(stops):
+    store = getPitStopsStore()
+    return [("constructor", store["constructor"][stops].astype(np.int64), len(store["constructorIds"]))]
+
+# @returns -> {df} with the names of its "constructor" indexes ("constructorName", "All Teams" if it has none)
+def setConstructorNames(df):
+    store = getPitStopsStore()
+    df["constructorName"] = store["constructorNames"][df.pop("constructor").to_numpy()] if "constructor" in df else ALL_TEAMS
+    return df
+
+
+# UP-LEFT GRAPH (Pit Stop Time by Season)
+# @returns -> dataframe with the distribution of the pit stop durations (see getDurationsDataframe) of each season in {yearRange},
+#               by constructor if {selected_constructors} (every team together otherwise, "All Teams").
+#               If {yearRange} is a single season, one row per race ("round", "officialName") instead
+def get_durations_by_season(yearRange, selected_constructors=None):
+    store = getPitStopsStore()
+    seasons, _, stops = getPitStopsSelection(yearRange, selected_constructors)
+    single_season = seasons.stop - seasons.start == 1
+
+    if single_season:
+        groups = [("race", store["race"][stops].astype(np.int64), len(store["raceIds"]))]
+    else:
+        groups = [("season", store["season"][stops].astype(np.int64), len(store["years"]))]
+    if selected_constructors:
+        groups += getConstructorsGroups(stops)
+    df = getDurationsDataframe(stops, groups)
+
+    if single_season:
+        race = df.pop("race").to_numpy()
+        df.insert(0, "year", store["years"][seasons.start])
+        df.insert(1, "round", store["rounds"][race])
+        df.insert(2, "officialName", store["officialNames"][race])
+    else:
+        df.insert(0, "year", store["years"][df.pop("season").to_numpy()])
+    return setConstructorNames(df)
+
+
+# UP-RIGHT GRAPH (Pit Stop Time by Team)
+# @returns -> dataframe with the distribution of the pit stop durations (see getDurationsDataframe) of each constructor in {yearRange}
+#               (only {selected_constructors}, if any), from the fastest median
+def get_durations_by_team(yearRange, selected_constructors=None):
+    _, _, stops = getPitStopsSelection(yearRange, selected_constructors)
+    df = setConstructorNames(getDurationsDataframe(stops, getConstructorsGroups(stops)))
+    return df.sort_values(by=["median", "constructorName"], kind="stable", ignore_index=True)
+
+
+# BOTTOM-LEFT GRAPH (Strategies)
+# @returns -> dataframe with one row per season in {yearRange} and number of stops ("strategy", 1, 2, ... {MAX_STRATEGY}+),
+#               with the drivers (of {selected_constructors}, if any) who made that many stops in a race ("count") and their share of the season
+def get_strategies(yearRange, selected_constructors=None):
+    store = getPitStopsStore()
+    seasons, constructors, _ = getPitStopsSelection(yearRange, selected_constructors)
+    counts = store["strategies"][seasons][:, constructors].sum(axis=1)[:, 1:]
+    totals = counts.sum(axis=1, keepdims=True)
+
+    df = pd.DataFrame({
+        "year": np.repeat(store["years"][seasons], MAX_STRATEGY),
+        "strategy": np.tile([str(stops) for stops in range(1, MAX_STRATEGY)] + [f"{MAX_STRATEGY}+"], len(counts)),
+        "count": counts.ravel(),
+        "share": (counts / np.maximum(totals, 1) * 100).ravel()
+    })
+    return df[np.repeat(totals[:, 0] > 0, MAX_STRATEGY)].reset_index(drop=True)
+
+
+# BOTTOM-RIGHT GRAPH (Stops by Lap Window)
+# @returns -> dataframe with one row per season in {yearRange} and lap window ("window", e.g. "0-20%"),
+#               with the number of stops (of {selected_constructors}, if any) made in that part of the races ("count")
+def get_lap_windows(yearRange, selected_constructors=None):
+    store = getPitStopsStore()
+    seasons, constructors, _ = getPitStopsSelection(yearRange, selected_constructors)
+    counts = store["windows"][seasons][:, constructors].sum(axis=1)
+    windows = [f"{idx * 100 // LAP_WINDOWS}-{(idx + 1) * 100 // LAP_WINDOWS}%" for idx in range(LAP_WINDOWS)]
+
+    df = pd.DataFrame({
+        "year": np.repeat(store["years"][seasons], LAP_WINDOWS),
+        "window": np.tile(windows, len(counts)),
+        "count": counts.ravel()
+    })
+    return df[np.repeat(counts.sum(axis=1) > 0, LAP_WINDOWS)].reset_index(drop=True)
@@ -0,0 +1,260 @@
+# File      BENCHMARKS | benchmark
+# Author    Matteo Naccarato
+
+# Times every public function of the backend modules and every dashboard callback over a realistic input matrix,
+# writes the results as JSON and compares them against a stored baseline.
+#   python benchmarks/benchmark.py                          # run and compare with benchmarks/baseline.json
+#   python benchmarks/benchmark.py --save-baseline          # run and store the results as the new baseline
+#   python benchmarks/benchmark.py --filter drivers         # only the cases whose name contains "drivers"
+# Every call is timed as in a running server, but without the callbacks' memoized outputs (cleared before each run):
+# the f1db tables and the per-version tables (aggregates, cubes, static figures) are built by a first untimed run.
+# Per-version builders are timed unwrapped, i.e. their build cost, as well as the loading of the tables ("f1db_tables.load").
+# Exit code is 1 if a case is slower than its baseline by more than {--tolerance} (and {--min-diff} ms)
+
+import argparse
+import inspect
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import dashboard # background tasks (e.g. data refresh) are not started: benchmarks run on the data on disk
+import backend.seasons as seasons
+import backend.circuits as circuits
+import backend.drivers as drivers
+import backend.teams as teams
+import backend.pitstops as pitstops
+import backend.laptimes as laptimes
+import backend.f1db_utils as f1db_utils
+import backend.f1db_tables as f1db_tables
+import backend.f1db_cache as f1db_cache
+
+BASELINE = f"{ROOT}/benchmarks/baseline.json"
+REPEAT = 5
+TOLERANCE = 0.25 # 25% slower than the baseline
+MIN_DIFF_MS = 2 # smaller slowdowns are noise
+
+
+# ==================INPUT MATRIX==================
+
+YEAR_RANGES = [[1985, 1995], [2005, 2015], [1950, 2024]]
+CIRCUITS = [["monza"], ["monaco"], ["interlagos"], ["monza", "monaco", "silverstone"]]
+DRIVERS = [["ayrton-senna", "alain-prost"], ["lewis-hamilton", "max-verstappen", "sebastian-vettel"], ["michael-schumacher"]]
+TEAMS = [["ferrari"], ["ferrari", "mclaren"], ["red-bull", "mercedes", "williams"]]
+TEAMS_RADIO = ["win", "win race", "podiums"]
+LAP_TIME_TYPES = ["fastest", "delta"] # besides the default "pole", whose cases keep the names they had before the lap time radio
+PIT_STOPS_YEAR_RANGES = YEAR_RANGES + [[2023, 2023]]
+PIT_STOPS_TEAMS = [None] + TEAMS
+PERFORMANCE_TYPES = [performanceType.value for performanceType in f1db_utils.PerformanceType]
+QUALI_RANGES = [[-f1db_utils.INFINITE_RESULT, f1db_utils.INFINITE_RESULT], [1, 5]]
+MIN_VALUES = [0, 1, 5]
+CURRENT_YEAR = 2024
+TABS = [tab.value for tab in dashboard.tabs_children]
+
+def colToApplyMin(performanceType):
+    return "count_podiums" if performanceType == f1db_utils.PerformanceType.PODIUMS.value else "count_position_1"
+
+# @returns -> {function name: list of argument tuples}.
+#               Each argument is either a value or a function returning it (built before timing, e.g. a dataframe)
+def getBackendInputs():
+    return {
+        "seasons.crateDriverElement": [(yearRange,) for yearRange in YEAR_RANGES],
+        "seasons.createDropDownDrivers": [(yearRange,) for yearRange in YEAR_RANGES],
+        "seasons.getDriversOptions": [(yearRange,) for yearRange in YEAR_RANGES],
+        "seasons.updateDropDownDrivers": [(yearRange,) for yearRange in YEAR_RANGES],
+        "seasons.createSeasonDriverPlot": [(radio, yearRange, driversIds) for radio in ["positionNumber", "points"] for yearRange, driversIds in zip(YEAR_RANGES, DRIVERS)],
+        "circuits.get_gp_held": [(minValue,) for minValue in [1, 30]],
+        "circuits.get_quali_race": [(circuitsIds,) for circuitsIds in CIRCUITS] + [(circuitsIds, yearRange) for circuitsIds in CIRCUITS[-1:] for yearRange in YEAR_RANGES],
+        "circuits.get_quali_race_counts": [(circuitsIds, qualiRange) for circuitsIds in CIRCUITS for qualiRange in QUALI_RANGES] + [(circuitsIds, QUALI_RANGES[0], yearRange) for circuitsIds in CIRCUITS[-1:] for yearRange in YEAR_RANGES],
+        "circuits.getQualiRaceCircuits": [(circuitsIds,) for circuitsIds in CIRCUITS],
+        "circuits.getQualiRaceSelection": [(circuitsIds, yearRange) for circuitsIds in CIRCUITS[-1:] for yearRange in [None] + YEAR_RANGES],
+        "circuits.getQualiPositionsRange": [(lambda circuitsIds=circuitsIds: circuits.getQualiRaceCube()["positionQualifying"][circuits.getQualiRaceSelection(circuitsIds)],) for circuitsIds in CIRCUITS],
+        "circuits.get_qualifying_times": [(circuitsIds,) for circuitsIds in CIRCUITS],
+        "drivers.getAbsolutePerformance": [(performanceType, minValue, colToApplyMin(performanceType)) for performanceType in PERFORMANCE_TYPES for minValue in MIN_VALUES],
+        "drivers.getAchievementIndex": [(CURRENT_YEAR, True), (CURRENT_YEAR, False)],
+        "drivers.getAchievementRanking": [(performanceType, CURRENT_YEAR, True) for performanceType in PERFORMANCE_TYPES],
+        "drivers.getDrivers": [(None,)] + [(performanceType,) for performanceType in PERFORMANCE_TYPES],
+        "drivers.getTrendPerformance": [(driversIds, performanceType) for driversIds in DRIVERS for performanceType in PERFORMANCE_TYPES],
+        "drivers.performanceType2Mask": [(lambda: f1db_tables.getTable(f1db_utils.seasons_driver_standings), performanceType) for performanceType in PERFORMANCE_TYPES],
+        "teams.createConstructorTrend": [(radio, teamsIds) for radio in TEAMS_RADIO for teamsIds in TEAMS],
+        "teams.createDropdown": [(radio,) for radio in TEAMS_RADIO],
+        "teams.createRaceWinPlot": [(minValue,) for minValue in MIN_VALUES],
+        "teams.createTotalPodiumPlot": [(minValue,) for minValue in MIN_VALUES],
+        "teams.createWinConstructorPlot": [(minValue,) for minValue in MIN_VALUES],
+        "teams.getConstructorRanking": [(column,) for column in teams.radio_columns.values()],
+        "laptimes.get_lap_times": [(circuitsIds,) for circuitsIds in CIRCUITS] + [(circuitsIds, yearRange) for circuitsIds in CIRCUITS[-1:] for yearRange in YEAR_RANGES],
+        "laptimes.get_era_trends": [(circuitsIds,) for circuitsIds in CIRCUITS],
+        "pitstops.getPitStopsConstructors": [(teamsIds,) for teamsIds in TEAMS],
+        "pitstops.getPitStopsSelection": [(yearRange, teamsIds) for yearRange in PIT_STOPS_YEAR_RANGES for teamsIds in PIT_STOPS_TEAMS],
+        "pitstops.getDurationsDistribution": [(lambda: pitstops.getPitStopsStore()["season"].astype("int64"), lambda: pitstops.getPitStopsStore()["millis"])],
+        "pitstops.getDurationsDataframe": [(lambda teamsIds=teamsIds: pitstops.getPitStopsSelection(YEAR_RANGES[-1], teamsIds)[2], lambda teamsIds=teamsIds: pitstops.getConstructorsGroups(pitstops.getPitStopsSelection(YEAR_RANGES[-1], teamsIds)[2])) for teamsIds in PIT_STOPS_TEAMS],
+        "pitstops.getConstructorsGroups": [(lambda teamsIds=teamsIds: pitstops.getPitStopsSelection(YEAR_RANGES[-1], teamsIds)[2],) for teamsIds in PIT_STOPS_TEAMS],
+        "pitstops.setConstructorNames": [(lambda: pitstops.get_durations_by_team(YEAR_RANGES[-1]).assign(constructor=0),)],
+        "pitstops.get_durations_by_season": [(yearRange, teamsIds) for yearRange in PIT_STOPS_YEAR_RANGES for teamsIds in PIT_STOPS_TEAMS],
+        "pitstops.get_durations_by_team": [(yearRange, teamsIds) for yearRange in PIT_STOPS_YEAR_RANGES for teamsIds in PIT_STOPS_TEAMS],
+        "pitstops.get_strategies": [(yearRange, teamsIds) for yearRange in PIT_STOPS_YEAR_RANGES for teamsIds in PIT_STOPS_TEAMS],
+        "pitstops.get_lap_windows": [(yearRange, teamsIds) for yearRange in PIT_STOPS_YEAR_RANGES for teamsIds in PIT_STOPS_TEAMS]
+    }
+
+def getCallbacksInputs():
+    return {
+        "render_content": [(tab,) for tab in TABS],
+        "update_dropdown": [(yearRange,) for yearRange in YEAR_RANGES],
+        "update_graph": [(radio, yearRange, driversIds, lambda yearRange=yearRange: seasons.updateDropDownDrivers(yearRange)) for radio in ["positionNumber", "points"] for yearRange, driversIds in zip(YEAR_RANGES, DRIVERS)],
+        "circuits_gp_held_data": [()],
+        "circuits_update_quali_race": [(circuitsIds,) for circuitsIds in CIRCUITS],
+        "circuits_update_qualifying": [(circuitsIds,) for circuitsIds in CIRCUITS] +
+                                      [(circuitsIds, lapTimeType) for circuitsIds in CIRCUITS for lapTimeType in LAP_TIME_TYPES],
+        "toggle_dropdown": [("absolute",), ("trend",)],
+        "update_drivers_dropdown": [(performanceType,) for performanceType in PERFORMANCE_TYPES],
+        "update_drivers_performance": [("absolute", performanceType, None) for performanceType in PERFORMANCE_TYPES] +
+                                      [("trend", performanceType, driversIds) for performanceType in PERFORMANCE_TYPES for driversIds in DRIVERS],
+        "toggle_teams_dropdown": [("absolute",), ("trend",)],
+        "update_teams_graph": [(radio, "absolute", None) for radio in TEAMS_RADIO] + [(radio, "trend", teamsIds) for radio in TEAMS_RADIO for teamsIds in TEAMS],
+        "update_teams_slider": [(radio,) for radio in TEAMS_RADIO],
+        "update_option_dropdown": [(radio,) for radio in TEAMS_RADIO],
+        "pitstops_update_seasons": [(yearRange, teamsIds) for yearRange in PIT_STOPS_YEAR_RANGES for teamsIds in PIT_STOPS_TEAMS],
+        "pitstops_update_teams": [(yearRange, teamsIds) for yearRange in PIT_STOPS_YEAR_RANGES for teamsIds in PIT_STOPS_TEAMS],
+        "pitstops_update_strategies": [(yearRange, teamsIds) for yearRange in PIT_STOPS_YEAR_RANGES for teamsIds in PIT_STOPS_TEAMS],
+        "pitstops_update_lap_windows": [(yearRange, teamsIds) for yearRange in PIT_STOPS_YEAR_RANGES for teamsIds in PIT_STOPS_TEAMS]
+    }
+
+# ================================================
+
+
+# @returns -> [(case name, function, argument tuples)] of every public function of the backend modules (per-version builders unwrapped).
+#               Functions without required parameters are run once with their defaults
+def getBackendCases():
+    inputs = getBackendInputs()
+    cases = []
+    for module in (seasons, circuits, laptimes, drivers, teams, pitstops):
+        moduleName = module.__name__.split(".")[-1]
+        for name, func in inspect.getmembers(module, inspect.isfunction):
+            if func.__module__ != module.__name__ or name.startswith("_"):
+                continue
+            key = f"{moduleName}.{name}"
+            if key in inputs:
+                cases.append((key, inspect.unwrap(func), inputs[key]))
+            elif all(param.default is not inspect.Parameter.empty for param in inspect.signature(func).parameters.values()):
+                cases.append((key, inspect.unwrap(func), [()]))
+            else:
+                raise KeyError(f"missing benchmark inputs for {key}")
+    return cases
+
+# Callbacks are timed without their memoization (the undecorated function)
+def getCallbacksCases():
+    return [(f"dashboard.{name}", inspect.unwrap(getattr(dashboard, name)), args) for name, args in getCallbacksInputs().items()]
+
+
+# @returns -> timings (ms) of {repeat} runs of func(*args), after a first untimed one.
+#               Every run starts without memoized callbacks outputs
+def timeCall(func, args, repeat):
+    timings = []
+    func(*[arg() if callable(arg) else arg for arg in args])
+    for _ in range(repeat):
+        f1db_cache.clearCache()
+        args_values = [arg() if callable(arg) else arg for arg in args]
+        start = time.perf_counter()
+        func(*args_values)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def timeLoadTables(repeat):
+    timings = []
+    for _ in range(repeat):
+        f1db_tables.clearTables()
+        start = time.perf_counter()
+        f1db_tables.loadTables()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def summary(timings):
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "min_ms": round(min(timings), 3),
+        "max_ms": round(max(timings), 3),
+        "runs": len(timings)
+    }
+
+
+# @returns -> {case name: summary}, case names include their arguments (e.g. "circuits.get_quali_race(['monza'])")
+def run(repeat, nameFilter=None):
+    results = {}
+    if not nameFilter or nameFilter in "f1db_tables.load":
+        results["f1db_tables.load"] = summary(timeLoadTables(repeat))
+
+    for name, func, argsList in getBackendCases() + getCallbacksCases():
+        for args in argsList:
+            caseName = f"{name}({', '.join('<table>' if callable(arg) else repr(arg) for arg in args)})"
+            if nameFilter and nameFilter not in caseName:
+                continue
+            try:
+                results[caseName] = summary(timeCall(func, args, repeat))
+            except Exception as e:
+                results[caseName] = {"error": f"{type(e).__name__}: {e}"}
+            print(f"{caseName[:100]:100s} {results[caseName].get('median_ms', results[caseName].get('error'))}")
+    return results
+
+# @returns -> cases slower than their baseline, as (case name, baseline median, new median)
+def compare(results, baseline, tolerance, minDiff):
+    regressions = []
+    for caseName, result in results.items():
+        previous = baseline.get(caseName)
+        if previous is None or "median_ms" not in previous or "median_ms" not in result:
+            continue
+        if result["median_ms"] > previous["median_ms"] * (1 + tolerance) and result["median_ms"] - previous["median_ms"] > minDiff:
+            regressions.append((caseName, previous["median_ms"], result["median_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="f1-data benchmarks")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--filter", default=None, help="run only the cases whose name contains this text")
+    parser.add_argument("--output", default=None, help="JSON file for the results")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--min-diff", type=float, default=MIN_DIFF_MS)
+    args = parser.parse_args()
+
+    results = {
+        "version": f1db_tables.getVersion(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "results": run(args.repeat, args.filter)
+    }
+    errors = [caseName for caseName, result in results["results"].items() if "error" in result]
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=1)
+        print(f"Baseline saved\t({args.baseline})")
+        return 1 if errors else 0
+
+    if not os.path.isfile(args.baseline):
+        print(f"No baseline to compare with\t({args.baseline})")
+        return 1 if errors else 0
+    with open(args.baseline, 'r') as file:
+        baseline = json.load(file)["results"]
+    regressions = compare(results["results"], baseline, args.tolerance, args.min_diff)
+    for caseName, previous, current in regressions:
+        print(f"SLOWER\t{caseName}\t{previous:.1f}ms -> {current:.1f}ms" + (f" ({current / previous:.2f}x)" if previous else ""))
+    for caseName in errors:
+        print(f"ERROR\t{caseName}\t{results['results'][caseName]['error']}")
+    print(f"{len(results['results'])} cases, {len(regressions)} slower than the baseline, {len(errors)} errors")
+    return 1 if regressions or errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
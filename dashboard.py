@@ -2,29 +2,88 @@
 # Authors   Matteo Naccarato 
 #           Maurizio Meschi
 
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import plotly.express as px
-from dash import Dash, dcc, html, Input, Output, callback
+from dash import Dash, dcc, html, Input, Output, MATCH, ClientsideFunction, callback, no_update
 import dash_bootstrap_components as dbc
+import flask
 import numpy as np
 
 import get_data
-
-# LOOK IF NEW DATA IS AVAILABLE
-get_data.get_data()
-
 import frontend.drivers
 import frontend.circuits
+import frontend.pitstops
 import backend.seasons as seasons
 import backend.drivers as drivers
 import backend.circuits as circuits
+import backend.laptimes as laptimes
 import backend.teams as teams
+import backend.pitstops as pitstops
 import backend.f1db_utils as f1db_utils
+import backend.f1db_metrics as f1db_metrics
+import backend.f1db_cache as f1db_cache
+import backend.f1db_aggregates as f1db_aggregates
+import backend.f1db_tables as f1db_tables
+import backend.f1db_figures as f1db_figures
 
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True)
 
+# HOT RELOAD: a new f1db version is loaded in background together with its static figures (see warm_up_tab), then swapped in.
+# Every request works on the version that was current when it started
+app.server.before_request(f1db_tables.pinSnapshot)
+app.server.teardown_request(f1db_tables.unpinSnapshot)
+
+# METRICS: stage timings of every callback (see f1db_metrics), cache counters and dataset version
+app.server.after_request(f1db_metrics.observeSerialize)
+
+@app.server.route("/metrics")
+def metrics():
+    return flask.Response(f1db_metrics.renderMetrics(f1db_tables.getVersion(), f1db_cache.getStats()), mimetype="text/plain; version=0.0.4")
+
+# STATIC FIGURES: the top row of the tabs, serialized and gzipped once per f1db version (see f1db_figures),
+# fetched by the browser from their route and cached by ETag until the dataset changes
+f1db_figures.addStaticFigure("seasons-gp", seasons.createSeason_GP_Plot)
+f1db_figures.addStaticFigure("seasons-geo", seasons.createSeasonGeo)
+f1db_figures.addStaticFigure("drivers-line", lambda: frontend.drivers.getDriversFigures()['numDriversPerYear'])
+f1db_figures.addStaticFigure("drivers-world", lambda: frontend.drivers.getDriversFigures()['worldSpread'])
+f1db_figures.addStaticFigure("teams-entrants", teams.creteNumTeamsEntrantsForYear)
+f1db_figures.addStaticFigure("teams-geo", teams.createCostructorGeo)
+
+@app.server.route("/figures/<name>")
+def static_figure(name):
+    if name not in f1db_figures.getStaticFigureNames():
+        flask.abort(404)
+    figure = f1db_figures.getStaticFigure(name)
+    encoding = "gzip" if "gzip" in flask.request.accept_encodings else "identity"
+    
+    response = flask.Response(figure[encoding], mimetype="application/json")
+    if encoding == "gzip":
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    response.cache_control.no_cache = True # always revalidated, 304 until the dataset changes
+    response.set_etag(figure["etag"][encoding])
+    response.make_conditional(flask.request)
+    
+    f1db_metrics.observeStaticFigure(name, encoding, response.status_code, 0 if response.status_code == 304 else len(figure[encoding]))
+    return response
+
+def static_graph(name):
+    return dcc.Graph(id={"type": "static-figure", "name": name}, className="h-100")
+
+app.clientside_callback(
+    ClientsideFunction(namespace="f1data", function_name="loadStaticFigure"),
+    Output({"type": "static-figure", "name": MATCH}, "figure"),
+    Input({"type": "static-figure", "name": MATCH}, "id")
+)
+
+
 # TABS STRUCTURE
-tabs = ["seasons", "circuits", "drivers", "teams"]
+tabs = ["seasons", "circuits", "drivers", "teams", "pit stops"]
 STARTING_TAB = 0
 tabs_children = []
 for idx, tab in enumerate(tabs):
@@ -60,7 +119,15 @@ app.layout = html.Div([
 ## CALLBACKS
 @callback(Output('tabs-content-graph', 'children'),
             Input('tabs-graph', 'value'))
+@f1db_metrics.instrument("layout")
 def render_content(tab):
+    return build_tab_layout(tab, *f1db_utils.getCurrentSeason())
+
+# Layout of each tab (with the options of its dropdowns and sliders) is built once per f1db version and shared by every session,
+# switching tab only serializes it. Its components are never modified once built.
+# It is also keyed on the current season (see f1db_utils.getCurrentSeason), as the seasons slider ends at the current year
+@f1db_aggregates.perVersion
+def build_tab_layout(tab, currentYear, currentSeasonOver):
     match tab:
         
         # SEASONS
@@ -68,8 +135,8 @@ def render_content(tab):
             return html.Div([
                 html.Hr(),
                 dbc.Row([
-                    dbc.Col(dcc.Graph(id="season_GP_graph", figure=seasons.createSeason_GP_Plot(), className="h-100"), width=6),
-                    dbc.Col(dcc.Graph(id="season_Geo_graph", figure=seasons.createSeasonGeo(), className="h-100"), width=6)
+                    dbc.Col(static_graph("seasons-gp"), width=6),
+                    dbc.Col(static_graph("seasons-geo"), width=6)
                 ], className="graph-section-seasons"),
                 html.Br(),
                 html.Br(),
@@ -99,12 +166,17 @@ def render_content(tab):
                     dbc.Row([
                         dbc.Col([
                             dbc.Col(html.Label("Min Value"), width=3),
-                            dbc.Col(frontend.circuits.circuits_gp_held_min_value, width=9) 
+                            dbc.Col(frontend.circuits.circuits_gp_held_min_value, width=9),
+                            dcc.Store(id="circuits-gp-held-data", data=circuits_gp_held_data())
                         ], className="d-flex justify-content-center", width=2),
-                        dbc.Col(frontend.circuits.circuits_dropdown, width=4),
+                        dbc.Col([
+                            frontend.circuits.createCircuitsDropdown(),
+                            frontend.circuits.lap_time_type_radio
+                        ], width=4),
                         dbc.Col([
                             html.Label("Qualifying Position Range"),
-                            frontend.circuits.quali_race_range
+                            frontend.circuits.quali_race_range,
+                            dcc.Store(id="circuits-quali-race-data")
                         ], width=6),    
                     ], className="d-flex justify-content-center"),
                     dcc.Graph(id='circuits-qualifying', className="h-100")
@@ -116,8 +188,8 @@ def render_content(tab):
         case 'tab-2-drivers':
             return html.Div([
                 dbc.Row([
-                    dbc.Col(dcc.Graph(id='drivers-line', figure=frontend.drivers.drivers_figures['numDriversPerYear'], className="h-100"), width=6),
-                    dbc.Col(dcc.Graph(id="drivers-world", figure=frontend.drivers.drivers_figures['worldSpread'], className="h-100"), width=6)
+                    dbc.Col(static_graph("drivers-line"), width=6),
+                    dbc.Col(static_graph("drivers-world"), width=6)
                 ], className="graph-section-circuits"),
                 html.Br(),
                 dbc.Stack([
@@ -140,11 +212,12 @@ def render_content(tab):
                                     ]),
                                     frontend.drivers.drivers_performance_min_value 
                                 ], id="drivers-min-value-id", width=12),
-                                dbc.Col(frontend.drivers.drivers_performance_dropdown, width=12, style={"max-width":"100px;"})
+                                dbc.Col(frontend.drivers.createDriversPerformanceDropdown(), width=12, style={"max-width":"100px;"})
                             ])
                         ], className="d-flex gap-4"),
                     ]),
                     dcc.Graph(id="drivers-performance", className="h-100"),
+                    dcc.Store(id="drivers-performance-data"),
                     html.Br()
                 ], className="graph-section-circuits")
             ], className="container-fluid")
@@ -154,8 +227,8 @@ def render_content(tab):
         case 'tab-3-teams':
             return html.Div([
                 dbc.Row([
-                    dbc.Col(dcc.Graph(id="entrants_teams_graph", figure=teams.creteNumTeamsEntrantsForYear(), className="h-100"), width=6),
-                    dbc.Col(dcc.Graph(id="geo_teams_graph", figure=teams.createCostructorGeo(), className="h-100"), width=6)
+                    dbc.Col(static_graph("teams-entrants"), width=6),
+                    dbc.Col(static_graph("teams-geo"), width=6)
                 ], className="graph-section-circuits"),
                 html.Br(),
                 dbc.Stack([
@@ -182,7 +255,32 @@ def render_content(tab):
                             ])
                         ], className="d-flex gap-4"),
                     ]),
-                    dcc.Graph(id="teams_graph", figure=teams.createWinConstructorPlot(), className="h-100")
+                    dcc.Graph(id="teams_graph", className="h-100"),
+                    dcc.Store(id="teams-graph-data")
+                ], className="graph-section-circuits")
+            ], className="container-fluid")
+        
+        # PIT STOPS
+        case 'tab-4-pit stops':
+            return html.Div([
+                html.Hr(className="mb-0"),
+                dbc.Row([
+                    dbc.Col(dcc.Graph(id="pitstops-seasons", className="h-100"), width=6),
+                    dbc.Col(dcc.Graph(id="pitstops-teams", className="h-100"), width=6)
+                ], className="graph-section-circuits"),
+                html.Br(),
+                dbc.Stack([
+                    dbc.Row([
+                        dbc.Col([
+                            html.Label("Seasons"),
+                            frontend.pitstops.createYearRangeSlider()
+                        ], width=6),
+                        dbc.Col(frontend.pitstops.createConstructorsDropdown(), width=4)
+                    ], className="d-flex justify-content-center"),
+                    dbc.Row([
+                        dbc.Col(dcc.Graph(id="pitstops-strategies", className="h-100"), width=6),
+                        dbc.Col(dcc.Graph(id="pitstops-lap-windows", className="h-100"), width=6)
+                    ], className="h-100")
                 ], className="graph-section-circuits")
             ], className="container-fluid")
         
@@ -196,6 +294,8 @@ def render_content(tab):
 @callback([Output('dropdown_drivers', 'options'),
            Output('dropdown_drivers', 'value')],
                Input('range-slider', 'value'))
+@f1db_metrics.instrument("seasons")
+@f1db_cache.memoize
 def update_dropdown(slider_value):
         return [seasons.updateDropDownDrivers(slider_value), ['ayrton-senna', 'alain-prost']]
 
@@ -204,6 +304,8 @@ def update_dropdown(slider_value):
                Input('range-slider', 'value'),
                Input('dropdown_drivers', 'value'),
                Input('dropdown_drivers', 'options')])
+@f1db_metrics.instrument("seasons")
+@f1db_cache.memoize
 def update_graph(radio_value, range_value, driver, option):
     if(driver == []):
         driver = [option[0]['value'], option[3]['value']]
@@ -214,180 +316,248 @@ def update_graph(radio_value, range_value, driver, option):
 
 
 # =================2================= CIRCUITS by Matteo Naccarato
-circuits_vars = {
-    "gp_held_max": 1,
-    "quali_race_range_min": -10,
-    "quali_race_range": [-10,50],
-    "quali_race_range_max": 50,
-}
-@app.callback(
+# SLIDERS: figures are built once with every point and shipped in a dcc.Store, sliders filter them in the browser (assets/clientside.js)
+
+# UP-LEFT GRAPH (GP Held)
+app.clientside_callback(
+    ClientsideFunction(namespace="f1data", function_name="getSliderMax"),
     [Output("circuits-gp-held-min-value-id", "max"),
     Output("circuits-gp-held-min-value-id", "marks")],
-    Input("circuits-gp-held", "figure"))
-def circuits_update_slider_marks(figure):
-    return [circuits_vars["gp_held_max"], {1:"1", str(circuits_vars["gp_held_max"]):str(circuits_vars["gp_held_max"])}]
-
+    Input("circuits-gp-held-data", "data")
+)
 
-# UP-LEFT GRAPH (GP Held)
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="f1data", function_name="filterFigure"),
     Output("circuits-gp-held", "figure"),
-    Input("circuits-gp-held-min-value-id", "value")
+    [Input("circuits-gp-held-data", "data"),
+     Input("circuits-gp-held-min-value-id", "value")]
 )
-def circuits_update_gp_held(min_value):
-    global circuits_vars
-    df = circuits.get_gp_held(min_value)
-    circuits_vars["gp_held_max"] = df["totalRacesHeld"].max()
-    fig = px.bar(
-        df,
-        x = "name",
-        y = "totalRacesHeld",
-        labels = circuits.labels_dict,
-        hover_data = {
-            "name": False,
-            "fullName": False,
-            "countryName": True,
-            "type": True
-        },
-        template = f1db_utils.template,
-        color_discrete_sequence =[f1db_utils.podium_colors["count_position_2"]]
-    ).update_layout(
-        f1db_utils.transparent_bg,
-        title = f1db_utils.getTitleObj("Number of GP Held by Circuit"),
-        hovermode = "x",
-        margin=f1db_utils.margin
-    ).update_traces(
-        hoverlabel=f1db_utils.getHoverlabel(),
-        hovertemplate="<b>%{y}</b>, %{customdata[1]}<br>Type: %{customdata[2]}<extra></extra>"
-    ) if not df.empty else f1db_utils.warning_empty_dataframe
+
+@f1db_cache.memoize
+def circuits_gp_held_data():
+    df = circuits.get_gp_held(0)
+    with f1db_metrics.stage("figure"):
+        fig = px.bar(
+            df,
+            x = "circuitName",
+            y = "totalRacesHeld",
+            labels = {**circuits.labels_dict, "circuitName": circuits.labels_dict["name"]},
+            hover_data = {
+                "circuitName": False,
+                "fullName": False,
+                "countryName": True,
+                "type": True
+            },
+            template = f1db_utils.template,
+            color_discrete_sequence =[f1db_utils.podium_colors["count_position_2"]]
+        ).update_layout(
+            f1db_utils.transparent_bg,
+            title = f1db_utils.getTitleObj("Number of GP Held by Circuit"),
+            hovermode = "x",
+            margin=f1db_utils.margin
+        ).update_traces(
+            hoverlabel=f1db_utils.getHoverlabel(),
+            hovertemplate="<b>%{y}</b>, %{customdata[1]}<br>Type: %{customdata[2]}<extra></extra>"
+        ) if not df.empty else f1db_utils.warning_empty_dataframe
     
-    return fig
+    return f1db_utils.getFilterableFigure(fig, df["totalRacesHeld"], empty=f1db_utils.warning_empty_dataframe)
 
 
 # UP-RIGHT GRAPH (Qualifying vs Race)
 @app.callback(
-    [Output("circuits-quali-race-range-id", "min"),
-    Output("circuits-quali-race-range-id", "max")],
-    Input("circuits-quali-race-results", "figure")
+    [Output("circuits-quali-race-data", "data"),
+     Output("circuits-quali-race-range-id", "min"),
+     Output("circuits-quali-race-range-id", "max")],
+    Input("circuits-dropdown", "value")
 )
-def circuits_update_quali_race(figure):
-    return [
-        circuits_vars["quali_race_range_min"],
-        circuits_vars["quali_race_range_max"]
-    ]
-    
-@app.callback(
-    Output("circuits-quali-race-results", "figure"),
-    [Input("circuits-dropdown", "value"),
-     Input("circuits-quali-race-range-id", "value")]
-)
-def circuits_update_quali_race(circuitsId, qualiRange):
-    if len(circuitsId) != 1: return f1db_utils.warning_empty_dataframe
-
-    # Update data to properly set the upper bound of the Qualifying Position slider 
-    global circuits_vars
-    df = circuits.get_quali_race(circuitsId)
-    circuits_vars["quali_race_range_min"] = df["positionQualifying"].min()
-    circuits_vars["quali_race_range_max"] = df["positionQualifying"].max()
-    
-    # Filter by Qualifying Position Range
-    df = df[df['positionQualifying'].isin(list(range(int(qualiRange[0]), int(qualiRange[1])+1)))] 
-    df.sort_values(by="raceId", inplace=True, ascending=False)
-
-    # Compute frequency values    
-    total_qualifying = df['positionQualifying'].value_counts().reset_index()
-    total_qualifying.columns = ['positionQualifying', 'total']
-    freq_df = df.groupby(['positionQualifying', 'positionRace']).size().reset_index(name='count')
-    freq_df = pd.merge(freq_df, total_qualifying, on='positionQualifying')
-    freq_df['count_per_total'] = freq_df['count'] / freq_df['total'] * 100
+@f1db_metrics.instrument("circuits")
+@f1db_cache.memoize
+def circuits_update_quali_race(circuitsId):
+    if not circuitsId: 
+        return [f1db_utils.getFilterableFigure(f1db_utils.warning_empty_dataframe), no_update, no_update]
+
+    # Counts of every (qualifying position, race result) of the selected circuits (summed if more than one)
+    qualiRange = [-f1db_utils.INFINITE_RESULT, f1db_utils.INFINITE_RESULT]
+    [freq_df, quali_race_range_min, quali_race_range_max] = circuits.get_quali_race_counts(circuitsId, qualiRange)
+    if freq_df.empty:
+        return [f1db_utils.getFilterableFigure(f1db_utils.warning_empty_dataframe), quali_race_range_min, quali_race_range_max]
     
     # Customize hoverlabel info with offical GP name and Driver info who achieved the pole
-    race_driver_info = df.groupby(['positionQualifying', 'positionRace']).apply(
-        lambda x: [{'officialName': row['officialName'], 'driverName': row['driverName']} for idx, row in x.iterrows()]
-    ).reset_index(name='raceDriverInfo')
-    freq_df = pd.merge(freq_df, race_driver_info, on=['positionQualifying', 'positionRace'])
     freq_df['raceDriverInfo'] = freq_df['raceDriverInfo'].apply(frontend.drivers.format_race_driver_info)
     
-    freq_df.reset_index(inplace=True)
-    freq_df.drop(columns=["index"], inplace=True)
-    
     # X-axis values
-    tickvals = np.linspace(circuits_vars["quali_race_range_min"], circuits_vars["quali_race_range_max"], circuits_vars["quali_race_range_max"])
-    ticktext = [val if val < (circuits_vars["quali_race_range_max"]) else frontend.drivers.NOT_QUALIFIED for val in tickvals]
+    tickvals = np.linspace(quali_race_range_min, quali_race_range_max, quali_race_range_max)
+    ticktext = [val if val < quali_race_range_max else frontend.drivers.NOT_QUALIFIED for val in tickvals]
                  
-    fig = px.scatter(freq_df, 
-        x = 'positionQualifying', 
-        y = 'positionRace', 
-        size = 'count',
-        labels = circuits.labels_dict,
-        template = f1db_utils.template,
-        color_discrete_sequence=f1db_utils.custom_colors
-    ).update_layout(
-        f1db_utils.transparent_bg,
-        title = f1db_utils.getTitleObj("Qualifying Position vs Race Position"),
-        xaxis = {
-            'tickvals': tickvals, 
-            'ticktext': ticktext  
-        },
-        margin=f1db_utils.margin
-    ).update_traces(
-        hovertemplate='Q: <b>%{x}</b><br>' + 
-        'R: <b>%{y}</b><br>' + 
-        'Count: <b>%{marker.size}</b> / %{customdata[0]} (<b>%{customdata[1]:.0f}%</b>)<br>' +
-        '%{customdata[2]}',
-        hoverlabel = f1db_utils.getHoverlabel(14)
-    )
+    with f1db_metrics.stage("figure"):
+        fig = px.scatter(freq_df, 
+            x = 'positionQualifying', 
+            y = 'positionRace', 
+            size = 'count',
+            labels = circuits.labels_dict,
+            template = f1db_utils.template,
+            color_discrete_sequence=f1db_utils.custom_colors
+        ).update_layout(
+            f1db_utils.transparent_bg,
+            title = f1db_utils.getTitleObj("Qualifying Position vs Race Position"),
+            xaxis = {
+                'tickvals': tickvals, 
+                'ticktext': ticktext  
+            },
+            margin=f1db_utils.margin
+        ).update_traces(
+            hovertemplate='Q: <b>%{x}</b><br>' + 
+            'R: <b>%{y}</b><br>' + 
+            'Count: <b>%{marker.size}</b> / %{customdata[0]} (<b>%{customdata[1]:.0f}%</b>)<br>' +
+            '%{customdata[2]}',
+            hoverlabel = f1db_utils.getHoverlabel(14)
+        )
     fig.data[0].customdata = freq_df[['total', 'count_per_total', 'raceDriverInfo']].values
     
-    return fig 
+    # Filtered by the Qualifying Position range slider
+    return [
+        f1db_utils.getFilterableFigure(fig, freq_df["positionQualifying"], empty=f1db_utils.warning_empty_dataframe),
+        quali_race_range_min,
+        quali_race_range_max
+    ]
+
+app.clientside_callback(
+    ClientsideFunction(namespace="f1data", function_name="filterFigure"),
+    Output("circuits-quali-race-results", "figure"),
+    [Input("circuits-quali-race-data", "data"),
+     Input("circuits-quali-race-range-id", "value")]
+)
+
+
+# BOTTOM GRAPH (Pole Lap Time | Fastest Lap Speed | Fastest Lap vs Pole)
+# Fastest laps and poles of every circuit are precomputed once per f1db version (see laptimes.getLapTimesStore), many circuits can be compared
 
+# @returns -> color of each circuit of {df}, the same one for its points and its era trends
+def circuits_colors(df):
+    return {circuitName: f1db_utils.custom_colors[idx % len(f1db_utils.custom_colors)] for idx, circuitName in enumerate(df["circuitName"].unique())}
+
+def circuits_fastest_laps(circuitsIds):
+    df = laptimes.get_lap_times(circuitsIds).dropna(subset=["speed"])
+    if df.empty:
+        return f1db_utils.warning_empty_dataframe
+    df_trends = laptimes.get_era_trends(circuitsIds)
+    colors = circuits_colors(df)
+    
+    with f1db_metrics.stage("figure"):
+        fig = px.scatter(
+            df,
+            x = "year",
+            y = "speed",
+            color = "circuitName",
+            custom_data = ["circuitName", "time", "driverName", "era"],
+            labels = laptimes.labels_dict,
+            color_discrete_map = colors,
+            template = f1db_utils.template
+        ).update_layout(
+            f1db_utils.transparent_bg,
+            title = f1db_utils.getTitleObj("Fastest Lap Speed Over the Years (dashed: trend of each era)"),
+            margin=f1db_utils.margin
+        ).update_traces(
+            hoverlabel = f1db_utils.getHoverlabel(14),
+            hovertemplate="<b>%{customdata[0]}</b> (%{x})<br><b>%{y:.1f} km/h</b>, %{customdata[1]}<br>%{customdata[2]}<br><i>%{customdata[3]}</i><extra></extra>"
+        )
+        if not df_trends.empty:
+            fig.add_traces(px.line(
+                df_trends,
+                x = "year",
+                y = "speed",
+                color = "circuitName",
+                custom_data = ["era", "slope", "races"],
+                color_discrete_map = colors
+            ).update_traces(
+                line_dash = "dash",
+                showlegend = False,
+                hoverlabel = f1db_utils.getHoverlabel(14),
+                hovertemplate="<b>%{customdata[0]}</b><br>%{customdata[1]:+.2f} km/h per season (%{customdata[2]} races)<extra></extra>"
+            ).data)
+    return fig
+
+def circuits_pace_delta(circuitsIds):
+    df = laptimes.get_lap_times(circuitsIds).dropna(subset=["deltaPercent"])
+    if df.empty:
+        return f1db_utils.warning_empty_dataframe
+    
+    with f1db_metrics.stage("figure"):
+        fig = px.line(
+            df,
+            x = "year",
+            y = "deltaPercent",
+            color = "circuitName",
+            markers = True,
+            custom_data = ["circuitName", "time", "driverName", "poleTime", "poleDriverName"],
+            labels = laptimes.labels_dict,
+            color_discrete_map = circuits_colors(df),
+            template = f1db_utils.template
+        ).update_layout(
+            f1db_utils.transparent_bg,
+            title = f1db_utils.getTitleObj("Fastest Lap in the Race vs Pole Lap"),
+            hovermode = "x",
+            margin=f1db_utils.margin
+        ).update_traces(
+            hoverlabel = f1db_utils.getHoverlabel(14),
+            hovertemplate="<b>%{customdata[0]}</b>: <b>%{y:+.2f}%</b><br>Race: %{customdata[1]} (%{customdata[2]})<br>Pole: %{customdata[3]} (%{customdata[4]})<extra></extra>"
+        )
+    return fig
 
-# BOTTOM GRAPH (Pole Lap Time)
 @app.callback(
     Output("circuits-qualifying", "figure"),
-     Input("circuits-dropdown", "value")
+    [Input("circuits-dropdown", "value"),
+     Input("circuits-lap-time-type-id", "value")]
 )
-def circuits_update_qualifying(circuitsIds):
+@f1db_metrics.instrument("circuits")
+@f1db_cache.memoize
+def circuits_update_qualifying(circuitsIds, lapTimeType="pole"):
     if not circuitsIds: 
         return f1db_utils.warning_empty_dataframe
+    if lapTimeType == "fastest":
+        return circuits_fastest_laps(circuitsIds)
+    if lapTimeType == "delta":
+        return circuits_pace_delta(circuitsIds)
     
-    df = circuits.get_qualifying_times(circuitsIds)
-    df = f1db_utils.order_df(df, "circuitId", circuitsIds)
+    df = circuits.get_qualifying_times(circuitsIds) # already in the order of {circuitsIds}
     
     # Y-axis values
     tickvals = np.logspace(np.log10(df['timeMillis'].min()), np.log10(df['timeMillis'].max()), num=5, base=10)
     ticktext = [f1db_utils.ms_to_time(val) for val in tickvals]
-    return px.line(
-        df,
-        x = "year",
-        y = "timeMillis", # Pole Lap Time
-        color = "circuitName",
-        markers = True,
-        labels = circuits.labels_dict,
-        hover_data = {
-            "year": False,
-            "timeMillis": False,
-            "circuitName": True,
-            "time": True,
-            "driverName": True,
-            "qualifyingFormat": True
-        },
-        color_discrete_sequence=f1db_utils.custom_colors,
-        template = f1db_utils.template
-    ).update_layout(
-        f1db_utils.transparent_bg,
-        title = f1db_utils.getTitleObj("Pole Lap Time Over the Years"),
-        hovermode = "x",
-        yaxis=dict(
-            tickvals=tickvals,
-            ticktext=ticktext,
-            tickmode='array',
-            title="Lap Time"
-        ),
-        margin=f1db_utils.margin
-    ).update_traces(
-            hoverlabel = f1db_utils.getHoverlabel(14),
-            hovertemplate="<br>".join(["<b>%{customdata[0]}</b> (%{x})<br><b>%{customdata[1]}</b>, <i>%{customdata[2]}</i><br>%{customdata[3]}<extra></extra>"])
-    ) if not df.empty else f1db_utils.warning_empty_dataframe
+    with f1db_metrics.stage("figure"):
+        fig = px.line(
+            df,
+            x = "year",
+            y = "timeMillis", # Pole Lap Time
+            color = "circuitName",
+            markers = True,
+            labels = circuits.labels_dict,
+            hover_data = {
+                "year": False,
+                "timeMillis": False,
+                "circuitName": True,
+                "time": True,
+                "driverName": True,
+                "qualifyingFormat": True
+            },
+            color_discrete_sequence=f1db_utils.custom_colors,
+            template = f1db_utils.template
+        ).update_layout(
+            f1db_utils.transparent_bg,
+            title = f1db_utils.getTitleObj("Pole Lap Time Over the Years"),
+            hovermode = "x",
+            yaxis=dict(
+                tickvals=tickvals,
+                ticktext=ticktext,
+                tickmode='array',
+                title="Lap Time"
+            ),
+            margin=f1db_utils.margin
+        ).update_traces(
+                hoverlabel = f1db_utils.getHoverlabel(14),
+                hovertemplate="<br>".join(["<b>%{customdata[0]}</b> (%{x})<br><b>%{customdata[1]}</b>, <i>%{customdata[2]}</i><br>%{customdata[3]}<extra></extra>"])
+        ) if not df.empty else f1db_utils.warning_empty_dataframe
+    return fig
 
 # =================2=================
 
@@ -402,6 +572,7 @@ def circuits_update_qualifying(circuitsIds):
      Output('drivers-min-value-id', 'style')],
     Input('drivers-performance-type-graph-id', 'value')
 )
+@f1db_metrics.instrument("drivers")
 def toggle_dropdown(selected_value):
     if selected_value == "absolute":
         return [{'display': 'none'},None]
@@ -414,6 +585,8 @@ def toggle_dropdown(selected_value):
     Output("drivers-performance-dropdown", "options"),
     Input("radio-drivers-performance-type-id", "value"),
 )
+@f1db_metrics.instrument("drivers")
+@f1db_cache.memoize
 def update_drivers_dropdown(performance_type):    
     return [
         {"label":row["driverName"], "value": row["driverId"]} for row in drivers.getDrivers(performance_type).to_dict(orient="records")
@@ -421,64 +594,56 @@ def update_drivers_dropdown(performance_type):
 
 
 # BOTTOM GRAPH (Drivers' WDCs / Wins / Podiums / Poles)
+# Absolute graph: every driver is in the figure, the min value slider filters them in the browser
 @app.callback(
-    [Output("drivers-performance", "figure"),
-     Output("drivers-performance-min-value-id", "max"),
-     Output("drivers-performance-min-value-id", "marks")],
+    Output("drivers-performance-data", "data"),
     [Input("drivers-performance-type-graph-id", "value"),
      Input("radio-drivers-performance-type-id", "value"),
-     Input("drivers-performance-min-value-id", "value"),
      Input("drivers-performance-dropdown", "value")]
 )
-def update_drivers_performance(graph_type, performance_type, min_value, selected_drivers):
+@f1db_metrics.instrument("drivers")
+@f1db_cache.memoize
+def update_drivers_performance(graph_type, performance_type, selected_drivers):
     df = []
     hover_data = {}
-    max_val = 0
     if (graph_type == "absolute"):
-        if (performance_type == drivers.PERFORMANCE_TYPE_DEFAULT and min_value == drivers.MIN_VALUE_DEFAULT):
-            df = drivers.dfs["absolutePerformance"] # standard values, use the one already computed
-        else:
-            df = drivers.getAbsolutePerformance(
-                performance_type, 
-                min_value, 
-                "count_podiums" if performance_type == f1db_utils.PerformanceType.PODIUMS.value else "count_position_1"
-            )
+        # Already sorted by count
+        colToApplyMin = "count_podiums" if performance_type == f1db_utils.PerformanceType.PODIUMS.value else "count_position_1"
+        df = drivers.getAbsolutePerformance(performance_type, 0, colToApplyMin)
         
         title = f"Most F1 {drivers.labels_dict[performance_type]}"
+        labels = drivers.labels_dict.copy() # per request labels, the shared dict is never modified
         match performance_type:
             case f1db_utils.PerformanceType.WDCS.value | f1db_utils.PerformanceType.WINS.value | f1db_utils.PerformanceType.POLES.value:
-                df.sort_values(by=["count_position_1"], ascending=False, inplace=True)         
                 y = "count_position_1"
-                drivers.labels_dict["count_position_1"] = f"Number of {drivers.labels_dict[performance_type]}"
-                max_val = df[y].max()
+                labels["count_position_1"] = f"Number of {drivers.labels_dict[performance_type]}"
                 
             case f1db_utils.PerformanceType.PODIUMS.value:
-                df.sort_values(by=["count_podiums"], ascending=False, inplace=True)
                 y = ["count_position_1", "count_position_2", "count_position_3"] 
-                drivers.labels_dict["count_position_1"] = "1°"
-                max_val = df["count_podiums"].max()
+                labels["count_position_1"] = "1°"
                 hover_data = { "count_podiums": True }
         
         x = "driverName"
-        if min_value <= max_val:
-            fig = px.bar(df, 
-                x = x, 
-                y = y,
-                labels = drivers.labels_dict,
-                hover_data = hover_data,
-                template = f1db_utils.template,
-                color_discrete_sequence =[f1db_utils.podium_colors["count_position_1"]]*len(df),
-                color_discrete_map=f1db_utils.podium_colors,
-                category_orders = {"y": ["count_position_1", "count_position_2", "count_position_3"]},
-            ).update_layout(
-                f1db_utils.transparent_bg,
-                title = f1db_utils.getTitleObj(title),
-                hovermode="x",
-                showlegend=True,
-                margin=dict(t=20, b=20)
-            ).for_each_trace(
-                lambda t: t.update(name = drivers.labels_dict[t.name]) if t.name in drivers.labels_dict else None
-            )
+        if not df.empty:
+            with f1db_metrics.stage("figure"):
+                fig = px.bar(df, 
+                    x = x, 
+                    y = y,
+                    labels = labels,
+                    hover_data = hover_data,
+                    template = f1db_utils.template,
+                    color_discrete_sequence =[f1db_utils.podium_colors["count_position_1"]]*len(df),
+                    color_discrete_map=f1db_utils.podium_colors,
+                    category_orders = {"y": ["count_position_1", "count_position_2", "count_position_3"]},
+                ).update_layout(
+                    f1db_utils.transparent_bg,
+                    title = f1db_utils.getTitleObj(title),
+                    hovermode="x",
+                    showlegend=True,
+                    margin=dict(t=20, b=20)
+                ).for_each_trace(
+                    lambda t: t.update(name = labels[t.name]) if t.name in labels else None
+                )
         
             if performance_type == f1db_utils.PerformanceType.PODIUMS.value:
                 fig.update_traces(
@@ -487,22 +652,21 @@ def update_drivers_performance(graph_type, performance_type, min_value, selected
                 )
                 fig.data[0].customdata = df[["count_podiums"]].values.tolist()
                 
-                return [fig, max_val, {1: "1", str(max_val): str(max_val)}]
-                
             else: # wdcs, wins, poles
-                return [fig.update_traces(
+                fig.update_traces(
                     hoverlabel=f1db_utils.getHoverlabel(),
                     hovertemplate="<b>%{y}<br><extra></extra>",
                     showlegend=True,
                     name= "1°"
-                ), max_val, {1: "1", str(max_val): str(max_val)}]
+                )
         else:
-            return [f1db_utils.warning_empty_dataframe, max_val, {1: "1", str(max_val): str(max_val)}]
+            fig = f1db_utils.warning_empty_dataframe
+        return f1db_utils.getFilterableFigure(fig, df[colToApplyMin], empty=f1db_utils.warning_empty_dataframe)
 
 
     elif selected_drivers is not None: # Performance Trend
         df = drivers.getTrendPerformance(selected_drivers, performance_type)
-        drivers.labels_dict["progressiveCounter"] = f"Number of {drivers.labels_dict[performance_type]}"
+        labels = {**drivers.labels_dict, "progressiveCounter": f"Number of {drivers.labels_dict[performance_type]}"}
         
         hover_data = {
             "driverName": True,
@@ -511,17 +675,15 @@ def update_drivers_performance(graph_type, performance_type, min_value, selected
         if performance_type != f1db_utils.PerformanceType.WDCS.value:
             hover_data["officialName"] = True
         
-        df = f1db_utils.order_df(df, "driverId", selected_drivers)
-        
         show_gp_name = "%{customdata[1]}" if performance_type != f1db_utils.PerformanceType.WDCS.value else ""
-        return [
-            px.line(
+        with f1db_metrics.stage("figure"):
+            fig = px.line(
                 df,
                 x = drivers.performanceType2TimeAxis[performance_type], 
                 y = "progressiveCounter", 
                 color = "driverName",
                 markers = True,
-                labels = drivers.labels_dict,
+                labels = labels,
                 hover_data = hover_data,
                 color_discrete_sequence=f1db_utils.custom_colors,
                 color_discrete_map = frontend.drivers.drivers_color_map,
@@ -535,13 +697,25 @@ def update_drivers_performance(graph_type, performance_type, min_value, selected
             ).update_traces(
                 hoverlabel = f1db_utils.getHoverlabel(13),
                 hovertemplate="<br>".join(["<b>%{customdata[0]}</b> (<b>%{y}</b>)<br>" + show_gp_name + "<extra></extra>"])
-            ) if not df.empty else f1db_utils.warning_empty_dataframe, 
-            max_val, 
-            { 1: "1", str(max_val): str(max_val) }
-        ]
+            ) if not df.empty else f1db_utils.warning_empty_dataframe
+        return f1db_utils.getFilterableFigure(fig)
 
     else:
-        return [f1db_utils.warning_empty_dataframe, max_val, {1: "1", str(max_val): str(max_val)}]
+        return f1db_utils.getFilterableFigure(f1db_utils.warning_empty_dataframe)
+
+app.clientside_callback(
+    ClientsideFunction(namespace="f1data", function_name="getSliderMax"),
+    [Output("drivers-performance-min-value-id", "max"),
+     Output("drivers-performance-min-value-id", "marks")],
+    Input("drivers-performance-data", "data")
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace="f1data", function_name="filterFigure"),
+    Output("drivers-performance", "figure"),
+    [Input("drivers-performance-data", "data"),
+     Input("drivers-performance-min-value-id", "value")]
+)
     
 # =================3================= 
 
@@ -552,27 +726,38 @@ def update_drivers_performance(graph_type, performance_type, min_value, selected
      Output('teams-min-value-id', 'style')],
     Input('radio-input-graph', 'value')
 )
+@f1db_metrics.instrument("teams")
 def toggle_teams_dropdown(selected_value):
     if selected_value == "absolute":
         return [{'display': 'none'},None]
     else:
         return [None,{'display': 'none'}]
     
-@callback(Output('teams_graph', 'figure'),
+# Absolute graph: every team is in the figure, the slider filters them in the browser (on the height of their bar)
+@callback(Output('teams-graph-data', 'data'),
              [Input('radio-input-teams', 'value'),
-              Input('teams-slider', 'value'),
               Input('radio-input-graph', 'value'),
               Input('dropdown', 'value')])
-def update_teams_graph(radio_value, slider_value, radio_graph_value, dropdown_value):
+@f1db_metrics.instrument("teams")
+@f1db_cache.memoize
+def update_teams_graph(radio_value, radio_graph_value, dropdown_value):
     if (radio_graph_value == 'trend'):
-        return teams.createConstructorTrend(radio_value, dropdown_value)
+        return f1db_utils.getFilterableFigure(teams.createConstructorTrend(radio_value, dropdown_value))
     else:
         if (radio_value == 'win'):
-            return teams.createWinConstructorPlot(slider_value)
+            fig = teams.createWinConstructorPlot(0)
         elif(radio_value == "win race"):
-            return teams.createRaceWinPlot(slider_value)
+            fig = teams.createRaceWinPlot(0)
         else:
-            return teams.createTotalPodiumPlot(slider_value)
+            fig = teams.createTotalPodiumPlot(0)
+        return f1db_utils.getFilterableFigure(fig, fig.data[0].y, minValue=1)
+
+app.clientside_callback(
+    ClientsideFunction(namespace="f1data", function_name="filterFigure"),
+    Output('teams_graph', 'figure'),
+    [Input('teams-graph-data', 'data'),
+     Input('teams-slider', 'value')]
+)
         
 
 @app.callback(
@@ -581,6 +766,8 @@ def update_teams_graph(radio_value, slider_value, radio_graph_value, dropdown_va
      Output('teams-slider', 'marks'),
      Output('teams-slider', 'value')],
         Input('radio-input-teams', 'value'))
+@f1db_metrics.instrument("teams")
+@f1db_cache.memoize
 def update_teams_slider(radio_input):
     value = teams.updateSliderValue()
     if (radio_input == "win"):
@@ -593,11 +780,223 @@ def update_teams_slider(radio_input):
 
 @callback(Output('dropdown_col', 'children'),
               Input('radio-input-teams', 'value'))
+@f1db_metrics.instrument("teams")
+@f1db_cache.memoize
 def update_option_dropdown(radio_value):
     return teams.createDropdown(radio_value)
 
 # =================4================= 
 
+
+
+
+# =================5================= PIT STOPS by Matteo Naccarato
+# Every graph is computed from the pit stops store (see pitstops.getPitStopsStore), only the selected seasons and teams are aggregated
+
+# UP-LEFT GRAPH (Pit Stop Time by Season, by Race if a single season is selected)
+@app.callback(
+    Output("pitstops-seasons", "figure"),
+    [Input("pitstops-year-range-id", "value"),
+     Input("pitstops-dropdown", "value")]
+)
+@f1db_metrics.instrument("pitstops")
+@f1db_cache.memoize
+def pitstops_update_seasons(yearRange, constructorIds):
+    df = pitstops.get_durations_by_season(yearRange, constructorIds)
+    if df.empty:
+        return f1db_utils.warning_empty_dataframe
+    
+    single_season = yearRange[0] == yearRange[1]
+    df["p25"] = df["median"] - df["p25"]
+    df["p75"] = df["p75"] - df["median"]
+    with f1db_metrics.stage("figure"):
+        fig = px.scatter(
+            df,
+            x = "round" if single_season else "year",
+            y = "median",
+            error_y = "p75",
+            error_y_minus = "p25",
+            color = "constructorName",
+            custom_data = ["constructorName", "best", "count", "officialName" if single_season else "year"],
+            labels = pitstops.labels_dict,
+            template = f1db_utils.template,
+            color_discrete_sequence = f1db_utils.custom_colors
+        ).update_layout(
+            f1db_utils.transparent_bg,
+            title = f1db_utils.getTitleObj(f"Pit Stop Time by Race ({yearRange[0]})" if single_season else "Pit Stop Time by Season"),
+            hovermode = "x",
+            margin=f1db_utils.margin
+        ).update_traces(
+            mode = "lines+markers",
+            hoverlabel = f1db_utils.getHoverlabel(13),
+            hovertemplate = "<b>%{customdata[0]}</b>: <b>%{y:.3f}s</b> (best %{customdata[1]:.3f}s, %{customdata[2]} stops)<extra></extra>" if not single_season else
+                "<b>%{customdata[0]}</b>: <b>%{y:.3f}s</b> (best %{customdata[1]:.3f}s, %{customdata[2]} stops)<br><i>%{customdata[3]}</i><extra></extra>"
+        )
+    return fig
+
+
+# UP-RIGHT GRAPH (Pit Stop Time by Team)
+@app.callback(
+    Output("pitstops-teams", "figure"),
+    [Input("pitstops-year-range-id", "value"),
+     Input("pitstops-dropdown", "value")]
+)
+@f1db_metrics.instrument("pitstops")
+@f1db_cache.memoize
+def pitstops_update_teams(yearRange, constructorIds):
+    df = pitstops.get_durations_by_team(yearRange, constructorIds)
+    if df.empty:
+        return f1db_utils.warning_empty_dataframe
+    
+    with f1db_metrics.stage("figure"):
+        fig = px.bar(
+            df,
+            x = "constructorName",
+            y = "median",
+            custom_data = ["best", "p25", "p75", "p90", "count"],
+            labels = pitstops.labels_dict,
+            template = f1db_utils.template,
+            color_discrete_sequence = [f1db_utils.F1_RED]
+        ).update_layout(
+            f1db_utils.transparent_bg,
+            title = f1db_utils.getTitleObj("Median Pit Stop Time by Team"),
+            hovermode = "x",
+            margin=f1db_utils.margin
+        ).update_traces(
+            hoverlabel = f1db_utils.getHoverlabel(13),
+            hovertemplate = "Median: <b>%{y:.3f}s</b><br>Best: <b>%{customdata[0]:.3f}s</b><br>" +
+                "25-75%: %{customdata[1]:.3f}s - %{customdata[2]:.3f}s<br>90%: %{customdata[3]:.3f}s<br>%{customdata[4]} stops<extra></extra>"
+        )
+    return fig
+
+
+# BOTTOM-LEFT GRAPH (Strategies)
+@app.callback(
+    Output("pitstops-strategies", "figure"),
+    [Input("pitstops-year-range-id", "value"),
+     Input("pitstops-dropdown", "value")]
+)
+@f1db_metrics.instrument("pitstops")
+@f1db_cache.memoize
+def pitstops_update_strategies(yearRange, constructorIds):
+    df = pitstops.get_strategies(yearRange, constructorIds)
+    if df.empty:
+        return f1db_utils.warning_empty_dataframe
+    
+    with f1db_metrics.stage("figure"):
+        fig = px.bar(
+            df,
+            x = "year",
+            y = "share",
+            color = "strategy",
+            custom_data = ["count"],
+            labels = pitstops.labels_dict,
+            template = f1db_utils.template,
+            color_discrete_sequence = f1db_utils.custom_colors
+        ).update_layout(
+            f1db_utils.transparent_bg,
+            title = f1db_utils.getTitleObj("Number of Pit Stops per Driver in a Race"),
+            hovermode = "x",
+            margin=f1db_utils.margin
+        ).update_traces(
+            hoverlabel = f1db_utils.getHoverlabel(13),
+            hovertemplate = "<b>%{y:.0f}%</b> (%{customdata[0]} drivers)<extra></extra>"
+        )
+    return fig
+
+
+# BOTTOM-RIGHT GRAPH (Stops by Lap Window)
+@app.callback(
+    Output("pitstops-lap-windows", "figure"),
+    [Input("pitstops-year-range-id", "value"),
+     Input("pitstops-dropdown", "value")]
+)
+@f1db_metrics.instrument("pitstops")
+@f1db_cache.memoize
+def pitstops_update_lap_windows(yearRange, constructorIds):
+    df = pitstops.get_lap_windows(yearRange, constructorIds)
+    if df.empty:
+        return f1db_utils.warning_empty_dataframe
+    
+    with f1db_metrics.stage("figure"):
+        fig = px.bar(
+            df,
+            x = "year",
+            y = "count",
+            color = "window",
+            labels = pitstops.labels_dict,
+            template = f1db_utils.template,
+            color_discrete_sequence = f1db_utils.custom_colors
+        ).update_layout(
+            f1db_utils.transparent_bg,
+            title = f1db_utils.getTitleObj("Pit Stops by Lap Window"),
+            hovermode = "x",
+            margin=f1db_utils.margin
+        ).update_traces(
+            hoverlabel = f1db_utils.getHoverlabel(13),
+            hovertemplate = "<b>%{y}</b><extra></extra>"
+        )
+    return fig
+
+# =================5================= 
+
+
+# WARM-UP
+# Data, layout and static figures of each tab are built on first use (nothing is loaded at import).
+# They can be prepared in background once the server is up (F1DB_WARM_UP=1), and are always rebuilt before a new version is swapped in
+# (the per-season tables are updated from the previous version's, see f1db_aggregates.perVersion)
+WARM_UP = os.environ.get("F1DB_WARM_UP", "0") == "1"
+WARM_UP_DELAY = 1 # seconds, to let the server start listening first
+
+# Not through render_content: off-request builds must not be observed as "layout" callbacks (see f1db_metrics.instrument)
+def warm_up_tab(tab):
+    build_tab_layout(tab.value, *f1db_utils.getCurrentSeason())
+
+def warm_up_drivers():
+    drivers.getAchievementIndex(*f1db_utils.getCurrentSeason())
+
+def warm_up_circuits():
+    circuits.getQualiRaceCube()
+    circuits.getPoleTimesStore()
+    laptimes.getLapTimesStore()
+
+def warm_up_pitstops():
+    pitstops.getPitStopsStore()
+
+def warm_up(delay=WARM_UP_DELAY):
+    time.sleep(delay)
+    with ThreadPoolExecutor(max_workers=len(tabs_children), thread_name_prefix="f1db-warm-up") as executor:
+        futures = [executor.submit(warm_up_tab, tab) for tab in tabs_children] + [executor.submit(warm_up_drivers), executor.submit(warm_up_circuits), executor.submit(warm_up_pitstops)]
+        futures += [executor.submit(f1db_figures.getStaticFigure, name) for name in f1db_figures.getStaticFigureNames()]
+        for future in futures:
+            future.result()
+    print("f1-data > Warm-up completed")
+
+for tab in tabs_children:
+    f1db_tables.addReloadHook(functools.partial(warm_up_tab, tab))
+f1db_tables.addReloadHook(warm_up_drivers)
+f1db_tables.addReloadHook(warm_up_circuits)
+f1db_tables.addReloadHook(warm_up_pitstops)
+for name in f1db_figures.getStaticFigureNames():
+    f1db_tables.addReloadHook(functools.partial(f1db_figures.getStaticFigure, name))
+
+
+
+# BACKGROUND TASKS of a running server (see also wsgi.py)
+#   - LOOK IF NEW DATA IS AVAILABLE (in background, the data already on disk is served meanwhile)
+#   - watch for new versions to hot reload
+#   - warm-up, if enabled
+def start_background_tasks(refresh=True):
+    if refresh:
+        get_data.start_refresh()
+    f1db_tables.startVersionWatcher()
+    if WARM_UP:
+        threading.Thread(target=warm_up, name="f1db-warm-up", daemon=True).start()
+
       
 if __name__ == '__main__':
+    # The debug reloader runs this module in a parent process (watching the files) and in a child one (serving):
+    # only the latter starts the background tasks
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_tasks()
     app.run(debug=True) 
\ No newline at end of file
@@ -2,9 +2,11 @@
 # Author    Matteo Naccarato
 
 from dash import dcc
+import dash_bootstrap_components as dbc
 
 import backend.f1db_utils as f1db_utils
 import backend.circuits as circuits
+import backend.f1db_aggregates as f1db_aggregates
 
 
 # ===================UI========================   
@@ -26,16 +28,32 @@ quali_race_range = dcc.RangeSlider(
     tooltip={"placement": "bottom", "always_visible": True}
 ) 
 
-circuits_dropdown = dcc.Dropdown(
-    id="circuits-dropdown",
-    options=[{"label": f'{row["circuitName"]}, {row["countryName"]}', "value": row["circuitId"]} for row in circuits.getCircuits().to_dict(orient="records")],
-    placeholder="Select a Circuit",
-    searchable=True,
-    clearable=False,
-    multi=True,
-    maxHeight=200,
-    value=["monza"]#,"monaco", "austria"]
-    # value=["interlagos"]
+lap_time_type_radio = dbc.RadioItems(
+    id="circuits-lap-time-type-id",
+    options=[
+        {"label": "Pole Lap Time", "value": "pole"},
+        {"label": "Fastest Lap Speed", "value": "fastest"},
+        {"label": "Fastest Lap vs Pole", "value": "delta"}
+    ],
+    value="pole",
+    inline=True
 )
 
+@f1db_aggregates.perVersion
+def getCircuitsOptions():
+    return [{"label": f'{row["circuitName"]}, {row["countryName"]}', "value": row["circuitId"]} for row in circuits.getCircuits().to_dict(orient="records")]
+
+def createCircuitsDropdown():
+    return dcc.Dropdown(
+        id="circuits-dropdown",
+        options=getCircuitsOptions(),
+        placeholder="Select a Circuit",
+        searchable=True,
+        clearable=False,
+        multi=True,
+        maxHeight=200,
+        value=["monza"]#,"monaco", "austria"]
+        # value=["interlagos"]
+    )
+
 # ===========================================
\ No newline at end of file
@@ -8,6 +8,7 @@ import dash_bootstrap_components as dbc
 
 import backend.f1db_utils as f1db_utils
 import backend.drivers as drivers
+import backend.f1db_aggregates as f1db_aggregates
 
 NOT_QUALIFIED = "NQ"
 
@@ -30,87 +31,96 @@ def format_driver_info(driver_info):
 # ===========================================
     
     
-# DRIVERS' world figure update (formatting)
-driver_info = drivers.dfs["worldSpread"].groupby(['nationalityCountryId','year']).apply(
-    lambda x: [{'driverName': row['driverName']} for idx, row in x.iterrows()]
-).reset_index(name='driverInfo')
-drivers.dfs["worldSpread"] = pd.merge(drivers.dfs["worldSpread"], driver_info, on=['nationalityCountryId','year'], how="left")
-drivers.dfs["worldSpread"]['driverInfo'] = drivers.dfs["worldSpread"]['driverInfo'].apply(format_driver_info)
-drivers.dfs["worldSpread"].sort_values(by="year", inplace=True)
+# DRIVERS' world dataframe update (formatting)
+def getWorldSpreadFormatted():
+    df = drivers.getWorldSpread()
+    driver_info = df.groupby(['nationalityCountryId','year'], observed=True).apply(
+        lambda x: [{'driverName': row['driverName']} for idx, row in x.iterrows()]
+    ).reset_index(name='driverInfo')
+    df = pd.merge(df, driver_info, on=['nationalityCountryId','year'], how="left")
+    df['driverInfo'] = df['driverInfo'].apply(format_driver_info)
+    df.sort_values(by="year", inplace=True)
+    return df
+
+CUSTOM_HOVERTEMPLATE = '<b>%{customdata[0]}</b>, %{customdata[1]}<br><br><b>%{customdata[2]}</b><br>%{customdata[3]}<extra></extra>'
 
 # ====================DRIVERs STATIC FIGURES'=======================
-drivers_figures = {
-    # UP-LEFT GRAPH (Number of Drivers)
-    "numDriversPerYear" : px.line(
-        drivers.dfs["numDriversPerYear"],
-        x = "year",
-        y = ["officialDriver","testDriver"],
-        markers = True,
-        color_discrete_sequence=f1db_utils.custom_colors,
-        labels = {
-            "value": "Number of Drivers",
-            "variable": "Driver Type",
-            "year": "Year"
-        },
-        hover_data = {
-            "variable": False,
-            "year": False
-        },
-        template = f1db_utils.template
-    ).for_each_trace(lambda t: t.update(name = drivers.driver_type[t.name]))
-    .update_layout(
-        f1db_utils.transparent_bg,
-        title = f1db_utils.getTitleObj("Number of Official Drivers and Test Drivers Over the Years"),
-        hovermode = "x",
-        margin=f1db_utils.margin
-    ).update_traces(
-        hoverlabel = f1db_utils.getHoverlabel(13),
-        hovertemplate="<b>%{y}</b><extra></extra>"
-    ),
-    # UP-RIGHT GRAPH (Distribution of Drivers' Nationalities)
-    "worldSpread": px.scatter_geo(
-        drivers.dfs["worldSpread"], 
-        locations = "alpha3Code", 
-        color = "continentName",
-        hover_name = "countryName", 
-        size = "count_display",
-        animation_frame = "year",
-        projection = "natural earth",
-        labels = drivers.labels_dict,
-        hover_data = {
-            'countryName': True,
-            'continentName': True,
-            'count': True,
-            'driverInfo': True,
-            "alpha3Code": False,
-            "year": False
-        },
-        color_discrete_map = {
-            'Africa': "rgb(99, 110, 250)", 
-            'Antarctica': "rgb(239, 85, 59)", 
-            'Asia': "rgb(0, 204, 150)", 
-            "Europe": "rgb(247,1,0)",
-            'Australia': "rgb(171, 99, 250)", 
-            'North America': "rgb(25, 211, 243)", 
-            'South America': "rgb(254, 203, 82)"
-        },
-        category_orders = f1db_utils.continents_order,
-        template = f1db_utils.template
-    ).update_layout(
-        f1db_utils.transparent_bg,
-        margin=f1db_utils.margin_geo,
-        title = f1db_utils.getTitleObj("Distribution of Drivers' Nationalities Over the Years"),
-    ).update_geos(f1db_utils.update_geos)
-}
+# Built once per f1db version (and again in background when a new version is loaded)
+@f1db_aggregates.perVersion
+def getDriversFigures():
+    drivers_figures = {
+        # UP-LEFT GRAPH (Number of Drivers)
+        "numDriversPerYear" : px.line(
+            drivers.getNumDriversPerYear(),
+            x = "year",
+            y = ["officialDriver","testDriver"],
+            markers = True,
+            color_discrete_sequence=f1db_utils.custom_colors,
+            labels = {
+                "value": "Number of Drivers",
+                "variable": "Driver Type",
+                "year": "Year"
+            },
+            hover_data = {
+                "variable": False,
+                "year": False
+            },
+            template = f1db_utils.template
+        ).for_each_trace(lambda t: t.update(name = drivers.driver_type[t.name]))
+        .update_layout(
+            f1db_utils.transparent_bg,
+            title = f1db_utils.getTitleObj("Number of Official Drivers and Test Drivers Over the Years"),
+            hovermode = "x",
+            margin=f1db_utils.margin
+        ).update_traces(
+            hoverlabel = f1db_utils.getHoverlabel(13),
+            hovertemplate="<b>%{y}</b><extra></extra>"
+        ),
+        # UP-RIGHT GRAPH (Distribution of Drivers' Nationalities)
+        "worldSpread": px.scatter_geo(
+            getWorldSpreadFormatted(), 
+            locations = "alpha3Code", 
+            color = "continentName",
+            hover_name = "countryName", 
+            size = "count_display",
+            animation_frame = "year",
+            projection = "natural earth",
+            labels = drivers.labels_dict,
+            hover_data = {
+                'countryName': True,
+                'continentName': True,
+                'count': True,
+                'driverInfo': True,
+                "alpha3Code": False,
+                "year": False
+            },
+            color_discrete_map = {
+                'Africa': "rgb(99, 110, 250)", 
+                'Antarctica': "rgb(239, 85, 59)", 
+                'Asia': "rgb(0, 204, 150)", 
+                "Europe": "rgb(247,1,0)",
+                'Australia': "rgb(171, 99, 250)", 
+                'North America': "rgb(25, 211, 243)", 
+                'South America': "rgb(254, 203, 82)"
+            },
+            category_orders = f1db_utils.continents_order,
+            template = f1db_utils.template
+        ).update_layout(
+            f1db_utils.transparent_bg,
+            margin=f1db_utils.margin_geo,
+            title = f1db_utils.getTitleObj("Distribution of Drivers' Nationalities Over the Years"),
+        ).update_geos(f1db_utils.update_geos)
+    }
 
-CUSTOM_HOVERTEMPLATE = '<b>%{customdata[0]}</b>, %{customdata[1]}<br><br><b>%{customdata[2]}</b><br>%{customdata[3]}<extra></extra>'
-drivers_figures["worldSpread"].update_traces(
-    hoverlabel=f1db_utils.getHoverlabel(13),
-    hovertemplate=CUSTOM_HOVERTEMPLATE
-)
-for frame in drivers_figures["worldSpread"].frames:
-    for data in frame.data:
-        data.hovertemplate = CUSTOM_HOVERTEMPLATE
+    drivers_figures["worldSpread"].update_traces(
+        hoverlabel=f1db_utils.getHoverlabel(13),
+        hovertemplate=CUSTOM_HOVERTEMPLATE
+    )
+    for frame in drivers_figures["worldSpread"].frames:
+        for data in frame.data:
+            data.hovertemplate = CUSTOM_HOVERTEMPLATE
+    
+    return drivers_figures
         
 # ===========================================       
         
@@ -147,16 +157,21 @@ drivers_performance_min_value = dcc.Slider(
     tooltip={"placement": "bottom", "always_visible": True}
 ) 
 
-drivers_performance_dropdown = dcc.Dropdown(
-    id="drivers-performance-dropdown",
-    options=[{"label":row["driverName"], "value": row["driverId"]} for row in drivers.getDrivers(drivers.PERFORMANCE_TYPE_DEFAULT).to_dict(orient="records")],
-    placeholder="Select a Driver",
-    searchable=True,
-    clearable=False,
-    multi=True,
-    maxHeight=200,
-    value=["lewis-hamilton","max-verstappen","sebastian-vettel"]  # "michael-schumacher"] 
-)    
+@f1db_aggregates.perVersion
+def getDriversOptions():
+    return [{"label":row["driverName"], "value": row["driverId"]} for row in drivers.getDrivers(drivers.PERFORMANCE_TYPE_DEFAULT).to_dict(orient="records")]
+
+def createDriversPerformanceDropdown():
+    return dcc.Dropdown(
+        id="drivers-performance-dropdown",
+        options=getDriversOptions(),
+        placeholder="Select a Driver",
+        searchable=True,
+        clearable=False,
+        multi=True,
+        maxHeight=200,
+        value=["lewis-hamilton","max-verstappen","sebastian-vettel"]  # "michael-schumacher"] 
+    )    
 
 drivers_color_map = {
     "Lewis Hamilton": "#D626FF",
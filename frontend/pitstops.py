@@ -0,0 +1,44 @@
+# File      FRONTEND | PIT STOPS
+# Author    Matteo Naccarato
+
+from dash import dcc
+
+import backend.pitstops as pitstops
+import backend.f1db_aggregates as f1db_aggregates
+
+
+# ===================UI========================
+
+# Seasons with pit stops data: every one of them is selected at first
+def createYearRangeSlider():
+    years = pitstops.getPitStopsStore()["years"]
+    first_year, last_year = (int(years[0]), int(years[-1])) if len(years) else (0, 0)
+    return dcc.RangeSlider(
+        id="pitstops-year-range-id",
+        min=first_year,
+        max=last_year,
+        step=1,
+        value=[first_year, last_year],
+        marks={year: str(year) for year in range(first_year, last_year + 1, 5)},
+        tooltip={"placement": "bottom", "always_visible": True}
+    )
+
+@f1db_aggregates.perVersion
+def getConstructorsOptions():
+    store = pitstops.getPitStopsStore()
+    constructors = sorted(set(store["constructor"].tolist()), key=lambda idx: store["constructorNames"][idx])
+    return [{"label": store["constructorNames"][idx], "value": store["constructorIds"][idx]} for idx in constructors]
+
+def createConstructorsDropdown():
+    return dcc.Dropdown(
+        id="pitstops-dropdown",
+        options=getConstructorsOptions(),
+        placeholder="All Teams",
+        searchable=True,
+        clearable=True,
+        multi=True,
+        maxHeight=200,
+        value=[]
+    )
+
+# ===========================================
@@ -1,36 +1,207 @@
+import fcntl
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
 import pandas as pd
-import requests, zipfile, io
+import requests, zipfile
 
-gh_latest_release = 'https://api.github.com/repos/f1db/f1db/releases/latest'
+import backend.f1db_utils as f1db_utils
+import backend.f1db_tables as f1db_tables
 
-folder = 'f1db-csv'
-last_version_file = "f1db_last_version_file.txt"
+# Endpoints can be overridden (e.g. a local stand-in server in tests)
+gh_latest_release = os.environ.get("F1DB_LATEST_RELEASE_URL", 'https://api.github.com/repos/f1db/f1db/releases/latest')
+gh_download = os.environ.get("F1DB_DOWNLOAD_URL", 'https://github.com/f1db/f1db/releases/download/{version}/f1db-csv.zip')
+TIMEOUT = float(os.environ.get("F1DB_TIMEOUT", 10)) # seconds, for connecting and between received bytes
+REFRESH_INTERVAL = float(os.environ.get("F1DB_REFRESH_INTERVAL", 3600)) # seconds between two checks of the elected process (see start_elected_refresh)
 
-# Download and extract from {url} to {folder}
+folder = f1db_utils.folder
+releases_folder = f1db_utils.releases_folder
+last_version_file = f1db_utils.last_version_file
+last_etag_file = f1db_utils.last_etag_file
+
+refresh_lock = threading.Lock()
+refresher_lock_file = f"{folder}/.refresher.lock"
+refresher_lock = None # open (and locked) {refresher_lock_file} of the process elected to refresh the data
+
+
+# @returns -> content of {fileName}, None if it does not exist
+def read_file(fileName):
+    try:
+        with open(fileName, 'r') as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def write_file(fileName, content):
+    with open(fileName, 'w') as file:
+        file.write(content)
+
+
+CHUNK_SIZE = 1024 * 1024 # bytes kept in memory while downloading/extracting
+
+
+# Stream {url} to {path} chunk by chunk.
+# A partial {path} left by an interrupted download is resumed (HTTP Range), unless the server sends the whole file again
+def download_archive(url, path):
+    downloaded = os.path.getsize(path) if os.path.isfile(path) else 0
+    headers = {"Range": f"bytes={downloaded}-"} if downloaded else {}
+    
+    with requests.get(url, headers=headers, stream=True, timeout=TIMEOUT) as r:
+        if r.status_code == 416: # nothing left to download
+            return path
+        r.raise_for_status()
+        mode = 'ab' if r.status_code == 206 else 'wb'
+        with open(path, mode) as file:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                file.write(chunk)
+    return path
+
+# @returns -> CRC-32 of {fileName}, read chunk by chunk
+def file_crc(fileName):
+    crc = 0
+    with open(fileName, 'rb') as file:
+        while chunk := file.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+# @returns -> True if {member} of the archive is already in {fileName} (same size and CRC, as listed in the central directory)
+def is_unchanged(member, fileName):
+    return (os.path.isfile(fileName)
+            and os.path.getsize(fileName) == member.file_size
+            and file_crc(fileName) == member.CRC)
+
+# Stage the whole release of {zip_path} in a temporary folder of {releases_folder}: the members that did not change since
+# {current_version} are hard links to its csv files (copies if they cannot be linked), only the changed ones are extracted.
+# The folder is then renamed to {releases_folder}/{version} at once (os.rename): a release is never seen half-extracted,
+# and it is not read by anyone until {last_version_file} names it (see publish)
+# @returns -> number of extracted files
+def extract_release(zip_path, version, current_version):
+    current_folder = f1db_tables.getCsvFolder(current_version)
+    release_folder = f"{releases_folder}/{version}"
+    os.makedirs(releases_folder, exist_ok=True)
+    tmp_folder = tempfile.mkdtemp(prefix=f".{version}-", dir=releases_folder)
+    changed = 0
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            for member in zf.infolist():
+                if member.is_dir():
+                    continue
+                fileName = os.path.basename(member.filename)
+                if is_unchanged(member, f"{current_folder}/{fileName}"):
+                    try:
+                        os.link(f"{current_folder}/{fileName}", f"{tmp_folder}/{fileName}")
+                    except OSError: # e.g. another file system
+                        shutil.copyfile(f"{current_folder}/{fileName}", f"{tmp_folder}/{fileName}")
+                    continue
+                with zf.open(member) as src, open(f"{tmp_folder}/{fileName}", 'wb') as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+                changed += 1
+        if os.path.isdir(release_folder): # left by a previous run stopped before publishing it, complete (renamed at once)
+            shutil.rmtree(release_folder)
+        os.rename(tmp_folder, release_folder)
+    finally:
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+    return changed
+
+# Make {version} the one on disk: {last_version_file} is atomically replaced (os.replace), it is the only file the readers
+# of a release look at to find its folder (see f1db_tables.getCsvFolder)
+def publish(version):
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(os.path.abspath(last_version_file)))
+    with os.fdopen(fd, 'w') as file:
+        file.write(version)
+    os.replace(tmp_path, last_version_file)
+
+# Download from {url} and publish it as a new release
 def download(url, last_version):
     print(f"f1-data > Downloading\t\t\t({last_version})")
-    r = requests.get(url)
-    zf = zipfile.ZipFile(io.BytesIO(r.content))
-    zf.extractall(folder)
-    with open(last_version_file, 'w') as file:
-        file.write(last_version)
-        print(f"f1-data > Successfully Downloaded\t({last_version})")
-
-# Get Data only if a new version is available                
+    os.makedirs(folder, exist_ok=True)
+    zip_path = download_archive(url, f"{folder}/.f1db-csv-{last_version}.zip.part")
+    try:
+        changed = extract_release(zip_path, last_version, f1db_tables.readVersion())
+    except zipfile.BadZipFile:
+        os.remove(zip_path) # corrupted, it cannot be resumed
+        raise
+    os.remove(zip_path)
+    publish(last_version)
+    print(f"f1-data > Successfully Downloaded\t({last_version}, {changed} files updated)")
+    
+    # One-time conversion of the new csv files into the binary cache, used by every later load
+    f1db_tables.buildCache(last_version)
+    print(f"f1-data > Binary cache built\t\t({last_version})")
+    
+    # A running dashboard swaps the new version in without restarting
+    f1db_tables.reload()
+
+# Get Data only if a new version is available.
+# The latest release is requested conditionally (If-None-Match): an unchanged release costs a 304 with no body
 def get_data():
-    response = requests.get(gh_latest_release)
+    current_version = read_file(last_version_file)
+    headers = {"Accept": "application/vnd.github+json"}
+    etag = read_file(last_etag_file)
+    if etag and current_version:
+        headers["If-None-Match"] = etag
+    
+    response = requests.get(gh_latest_release, headers=headers, timeout=TIMEOUT)
+    if response.status_code == 304:
+        print(f"f1-data > Already up to date\t({current_version})")
+        return
+    response.raise_for_status()
+    
     last_version = response.json()["name"]
     print(f"f1-data > Fetching Version\t({last_version})")
-    url = f'https://github.com/f1db/f1db/releases/download/{last_version}/f1db-csv.zip'
+    if current_version == last_version:
+        print(f"f1-data > Already up to date\t({last_version})")
+    else:
+        download(gh_download.format(version=last_version), last_version)
+    
+    # Stored only once the release is on disk, so that a failed download is retried next time
+    if response.headers.get("ETag"):
+        write_file(last_etag_file, response.headers["ETag"])
+
 
+# Same as get_data(), but failures (e.g. no network, timeout, rate limit) are reported instead of raised:
+# the data already on disk keeps being used. Concurrent refreshes are skipped
+# @returns -> True if the refresh completed
+def refresh():
+    if not refresh_lock.acquire(blocking=False):
+        return False
     try:
-        with open(last_version_file, 'r') as file:
-            content = file.read().strip()
-        
-        if content == last_version:
-            print(f"f1-data > Already up to date\t({last_version})")
-        else:
-            download(url, last_version)
+        get_data()
+        return True
+    except (requests.RequestException, zipfile.BadZipFile, OSError, ValueError, KeyError) as e:
+        print(f"f1-data > Refresh failed, using local data\t({type(e).__name__}: {e})")
+        return False
+    finally:
+        refresh_lock.release()
 
-    except FileNotFoundError:
-        download(url, last_version)
\ No newline at end of file
+# Refresh the data without blocking the caller.
+# The first run (no data on disk) has nothing to serve yet: it waits for the download
+# @returns -> the background thread, None if the refresh has been run in the foreground
+def start_refresh():
+    if read_file(last_version_file) is None:
+        get_data()
+        return None
+    thread = threading.Thread(target=refresh, name="f1db-refresh", daemon=True)
+    thread.start()
+    return thread
+
+# Refresh the data every {interval} seconds from a single process among the ones serving the same {folder} (e.g. the gunicorn workers):
+# the one holding an exclusive lock on {refresher_lock_file}, kept for its whole life. The OS releases it when that process exits
+# (crash, timeout, recycled by max_requests), then one of the waiting processes is elected and refreshes in its turn
+# @returns -> the background thread waiting for the election
+def start_elected_refresh(interval=REFRESH_INTERVAL):
+    def elect():
+        global refresher_lock
+        os.makedirs(folder, exist_ok=True)
+        lock = open(refresher_lock_file, "a")
+        fcntl.flock(lock, fcntl.LOCK_EX) # blocks until no other process holds it
+        refresher_lock = lock
+        while True:
+            refresh()
+            time.sleep(interval)
+    thread = threading.Thread(target=elect, name="f1db-refresher-election", daemon=True)
+    thread.start()
+    return thread
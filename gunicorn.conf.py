@@ -0,0 +1,20 @@
+# File      GUNICORN CONF
+# Author    Matteo Naccarato
+
+# gunicorn -c gunicorn.conf.py wsgi:server
+
+import multiprocessing
+import os
+
+bind = os.environ.get("F1DATA_BIND", "0.0.0.0:8050")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.environ.get("F1DATA_THREADS", 2))
+timeout = 120
+
+# The app (tables, aggregates, static figures) is loaded once in the master and shared by the forked workers (see wsgi.py)
+preload_app = True
+
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.start_worker()
@@ -0,0 +1,40 @@
+# File      WSGI
+# Author    Matteo Naccarato
+
+# Production entry point, e.g.  gunicorn -c gunicorn.conf.py wsgi:server
+# The app is preloaded once in the master process and then forked into the workers:
+#   - every f1db table is loaded before forking. Numeric columns (and the codes of the text ones) are memory-mapped
+#     from the binary cache, so all the workers read the same pages of the OS page cache
+#   - per-version aggregates and static figures are built before forking, and shared copy-on-write by the workers
+#   - gc.freeze() moves all these objects out of the garbage collector, whose passes would otherwise write
+#     every object header and copy the shared pages in each worker
+
+import gc
+import os
+
+import get_data
+import dashboard
+import backend.f1db_tables as f1db_tables
+
+app = dashboard.app
+server = app.server
+
+
+# Load everything the workers need, in the master process
+def preload():
+    if get_data.read_file(get_data.last_version_file) is None: # first run, nothing to serve yet
+        get_data.get_data()
+    f1db_tables.loadTables()
+    dashboard.warm_up(delay=0)
+    gc.collect()
+    gc.freeze()
+    print(f"f1-data > Preloaded\t\t\t({f1db_tables.getVersion()}, pid {os.getpid()})")
+
+# Background threads do not survive fork: they are started in every worker.
+# Only one worker at a time looks for new data (see get_data.start_elected_refresh), every one hot reloads it through its version watcher
+def start_worker():
+    dashboard.start_background_tasks(refresh=False)
+    get_data.start_elected_refresh()
+
+
+preload()